@@ -5,17 +5,52 @@ Chapter 11. Common Design Patterns
 """
 from __future__ import annotations
 import abc
+import functools
 import re
 import random
-from typing import cast, Optional, Union, Sequence
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, cast, Iterator, NamedTuple, Optional, Union, Sequence
+
+from dice_rng import (
+    GLOBAL_RANDOM,
+    NumpyRandom,
+    PythonRandom,
+    RandomSource,
+    ThreadLocalRandom,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore [assignment]
+
+
+# Below this many rolls, setting up the arrays costs more than it saves.
+VECTORIZE_MIN = 64
+
+# The vectorized rolls work in int64; totals that might not fit are rolled
+# one at a time, with Python's unbounded ints.
+INT64_MAX = 2**63 - 1
+
+# dice_roller_stream() rolls and formats this many at a time.
+STREAM_SLICE = 16 * 1024
 
 
 class Adjustment(abc.ABC):
     def __init__(self, amount: int) -> None:
         self.amount = amount
 
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.amount})"
+
     @abc.abstractmethod
-    def apply(self, dice: "Dice") -> None:
+    def apply(self, result: "RollResult") -> None:
+        ...
+
+    @abc.abstractmethod
+    def apply_many(self, batch: "RollBatch") -> None:
+        """Like :meth:`apply`, on every row of ``batch.dice``."""
         ...
 
 
@@ -24,63 +59,164 @@ class Roll(Adjustment):
         self.n = n
         self.d = d
 
-    def apply(self, dice: "Dice") -> None:
-        dice.dice = sorted(random.randint(1, self.d) for _ in range(self.n))
-        dice.modifier = 0
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.n}, {self.d})"
+
+    def apply(self, result: "RollResult") -> None:
+        result.dice = sorted(result.rng.randints(self.d, self.n))
+        result.modifier = 0
+
+    def apply_many(self, batch: "RollBatch") -> None:
+        rolls = batch.rng.randint_array(self.d, batch.count * self.n)
+        batch.dice = numpy.sort(rolls.reshape(batch.count, self.n), axis=1)
+        batch.modifier = 0
 
 
 class Drop(Adjustment):
-    def apply(self, dice: "Dice") -> None:
-        dice.dice = dice.dice[self.amount :]
+    def apply(self, result: "RollResult") -> None:
+        result.dice = result.dice[self.amount :]
+
+    def apply_many(self, batch: "RollBatch") -> None:
+        batch.dice = batch.dice[:, self.amount :]
 
 
 class Keep(Adjustment):
-    def apply(self, dice: "Dice") -> None:
-        dice.dice = dice.dice[: self.amount]
+    def apply(self, result: "RollResult") -> None:
+        result.dice = result.dice[: self.amount]
+
+    def apply_many(self, batch: "RollBatch") -> None:
+        batch.dice = batch.dice[:, : self.amount]
 
 
 class Plus(Adjustment):
-    def apply(self, dice: "Dice") -> None:
-        dice.modifier += self.amount
+    def apply(self, result: "RollResult") -> None:
+        result.modifier += self.amount
+
+    def apply_many(self, batch: "RollBatch") -> None:
+        batch.modifier += self.amount
 
 
 class Minus(Adjustment):
-    def apply(self, dice: "Dice") -> None:
-        dice.modifier -= self.amount
+    def apply(self, result: "RollResult") -> None:
+        result.modifier -= self.amount
+
+    def apply_many(self, batch: "RollBatch") -> None:
+        batch.modifier -= self.amount
+
+
+class RollResult:
+    """The dice and modifier of one roll, as the adjustments leave them."""
+
+    __slots__ = ("rng", "dice", "modifier")
+
+    def __init__(
+        self,
+        rng: RandomSource = GLOBAL_RANDOM,
+        dice: Optional[list[int]] = None,
+        modifier: int = 0,
+    ) -> None:
+        self.rng = rng
+        self.dice = dice or []
+        self.modifier = modifier
+
+    @property
+    def total(self) -> int:
+        return sum(self.dice) + self.modifier
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.dice}, {self.modifier})"
+
+
+class RollBatch:
+    """A :class:`RollResult` for ``count`` rolls at once, one per row of ``dice``."""
+
+    __slots__ = ("rng", "count", "dice", "modifier")
+
+    def __init__(self, count: int, rng: RandomSource = GLOBAL_RANDOM) -> None:
+        self.rng = rng
+        self.count = count
+        self.dice: Any = None
+        self.modifier = 0
 
 
 class Dice:
+    """A dice expression. Every roll works on a new :class:`RollResult`,
+    so one ``Dice`` can be shared by any number of threads or tasks.
+    """
+
     def __init__(self, n: int, d: int, *adj: Adjustment) -> None:
-        self.adjustments = [cast(Adjustment, Roll(n, d))] + list(adj)
-        self.dice: list[int]
-        self.modifier: int
+        self.adjustments: tuple[Adjustment, ...] = (Roll(n, d), *adj)
+        modifiers = sum(a.amount for a in adj if isinstance(a, (Plus, Minus)))
+        self.vectorize = n * d + modifiers <= INT64_MAX
 
-    def roll(self) -> int:
+    def roll_result(self, rng: RandomSource = GLOBAL_RANDOM) -> RollResult:
+        result = RollResult(rng)
         for a in self.adjustments:
-            a.apply(self)
-        return sum(self.dice) + self.modifier
+            a.apply(result)
+        return result
+
+    def roll(self, rng: RandomSource = GLOBAL_RANDOM) -> int:
+        return self.roll_result(rng).total
+
+    def roll_many(self, count: int, rng: RandomSource = GLOBAL_RANDOM) -> list[int]:
+        """The same as ``[self.roll() for _ in range(count)]``, but vectorized.
+
+        All ``count`` rolls are drawn into one ``(count, n)`` array and each
+        adjustment slices or shifts every row at once. Fewer than
+        :data:`VECTORIZE_MIN` rolls, or totals that could overflow int64,
+        are made one at a time.
+        """
+        if numpy is None or count < VECTORIZE_MIN or not self.vectorize:
+            return [self.roll(rng) for _ in range(count)]
+        batch = RollBatch(count, rng)
+        for a in self.adjustments:
+            a.apply_many(batch)
+        return cast(list[int], (batch.dice.sum(axis=1) + batch.modifier).tolist())
+
+    @classmethod
+    def from_spec(cls, spec: "DiceSpec") -> "Dice":
+        return cls(spec.n, spec.d, *spec.adjustments)
 
     @classmethod
     def from_text(cls, dice_text: str) -> "Dice":
-        dice_pattern = re.compile(r"(?P<n>\d*)d(?P<d>\d+)(?P<a>[dk+-]\d+)*")
-        adjustment_pattern = re.compile(r"([dk+-])(\d+)")
-        adj_class: dict[str, type[Adjustment]] = {
-            "d": Drop,
-            "k": Keep,
-            "+": Plus,
-            "-": Minus,
-        }
-
-        if (dice_match := dice_pattern.match(dice_text)) is None:
-            raise ValueError(f"Error in {dice_text!r}")
-
-        n = int(dice_match.group("n")) if dice_match.group("n") else 1
-        d = int(dice_match.group("d"))
-        adjustment_matches = adjustment_pattern.finditer(dice_match.group("a") or "")
-        adjustments = [
-            adj_class[a.group(1)](int(a.group(2))) for a in adjustment_matches
-        ]
-        return cls(n, d, *adjustments)
+        return cls.from_spec(parse_dice(dice_text))
+
+
+DICE_PATTERN = re.compile(r"(?P<n>\d*)d(?P<d>\d+)(?P<a>(?:[dk+-]\d+)*)")
+ADJUSTMENT_PATTERN = re.compile(r"([dk+-])(\d+)")
+ADJUSTMENT_CLASS: dict[str, type[Adjustment]] = {
+    "d": Drop,
+    "k": Keep,
+    "+": Plus,
+    "-": Minus,
+}
+
+
+class DiceSpec(NamedTuple):
+    """A parsed dice expression, shared by every :class:`Dice` built from it.
+
+    Adjustments only ever change the :class:`RollResult` they're applied
+    to, so a spec can be handed out freely.
+    """
+
+    n: int
+    d: int
+    adjustments: tuple[Adjustment, ...]
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_dice(dice_text: str) -> DiceSpec:
+    """Parse ``dice_text``, reusing the spec for recently seen text."""
+    if (dice_match := DICE_PATTERN.match(dice_text)) is None:
+        raise ValueError(f"Error in {dice_text!r}")
+
+    n = int(dice_match.group("n")) if dice_match.group("n") else 1
+    d = int(dice_match.group("d"))
+    adjustment_matches = ADJUSTMENT_PATTERN.finditer(dice_match.group("a"))
+    adjustments = tuple(
+        ADJUSTMENT_CLASS[a.group(1)](int(a.group(2))) for a in adjustment_matches
+    )
+    return DiceSpec(n, d, adjustments)
 
 
 D4 = 4
@@ -102,11 +238,19 @@ class Dice2:
     def __init__(self, n: int, d: int) -> None:
         self.n = n
         self.d = d
-        self.dice: list[int]
+        self.vectorize = n * d <= INT64_MAX
+
+    def roll_result(self, rng: RandomSource = GLOBAL_RANDOM) -> RollResult:
+        return RollResult(rng, rng.randints(self.d, self.n))
 
-    def roll(self) -> int:
-        self.dice = [random.randint(1, self.d) for _ in range(self.n)]
-        return sum(self.dice)
+    def roll(self, rng: RandomSource = GLOBAL_RANDOM) -> int:
+        return self.roll_result(rng).total
+
+    def roll_many(self, count: int, rng: RandomSource = GLOBAL_RANDOM) -> list[int]:
+        if numpy is None or count < VECTORIZE_MIN or not self.vectorize:
+            return [self.roll(rng) for _ in range(count)]
+        rolls = rng.randint_array(self.d, count * self.n)
+        return cast(list[int], rolls.reshape(count, self.n).sum(axis=1).tolist())
 
 
 # Instead of an abstract class, rely on duck typing...
@@ -114,19 +258,83 @@ DiceRoller = Union[Dice2, Dice]
 implementations: dict[str, type[DiceRoller]] = {"Dice2": Dice2, "Dice": Dice}
 
 
-def dice_roller(request: bytes) -> bytes:
+REQUEST_PATTERN = re.compile(r"(\w+) (\d+) (.*)")
+
+
+def parse_request(request: bytes) -> tuple[str, int, DiceRoller]:
+    """The text of a ``Dice 6 4d6d1`` request, how many rolls, and the dice."""
     request_text = request.decode("utf-8")
-    request_pattern = re.compile(r"(\w+) (\d+) (.*)")
-    if (request_match := request_pattern.match(request_text)) is None:
+    if (request_match := REQUEST_PATTERN.match(request_text)) is None:
         raise ValueError(f"Error in {request!r}")
     model_class = implementations[request_match.group(1)]
     count = int(request_match.group(2))
-    dice = model_class.from_text(request_match.group(3))
-    numbers = [dice.roll() for _ in range(count)]
+    return request_text, count, model_class.from_text(request_match.group(3))
+
+
+def dice_roller(request: bytes, rng: RandomSource = GLOBAL_RANDOM) -> bytes:
+    request_text, count, dice = parse_request(request)
+    numbers = dice.roll_many(count, rng)
     response = f"{request_text} = {numbers}"
     return response.encode("utf-8")
 
 
+def dice_roller_stream(
+    request: bytes, rng: RandomSource = GLOBAL_RANDOM, size: int = STREAM_SLICE
+) -> Iterator[bytes]:
+    """:func:`dice_roller`'s response in pieces, ``size`` rolls at a time.
+
+    The first slice is rolled before anything is yielded, so a bad request
+    raises from the first ``next()``.
+    """
+    request_text, count, dice = parse_request(request)
+    separator = f"{request_text} = ["
+    for start in range(0, count, size):
+        numbers = dice.roll_many(min(size, count - start), rng)
+        yield (separator + ", ".join(map(str, numbers))).encode("utf-8")
+        separator = ", "
+    yield b"]" if count else (separator + "]").encode("utf-8")
+
+
+def dice_roller_batch(
+    requests: Sequence[bytes], rng: RandomSource = GLOBAL_RANDOM
+) -> list[bytes]:
+    """Answer many :func:`dice_roller` requests, in order, with one roll per expression.
+
+    Requests for the same dice are grouped, and each group is rolled with a
+    single ``roll_many()``, groups in order of first appearance. A request
+    that can't be answered gets the ``repr()`` of its error, as the servers
+    send, instead of spoiling the rest of the batch.
+    """
+    responses: list[bytes] = [b""] * len(requests)
+    groups: dict[tuple[str, str], list[tuple[int, str, int]]] = {}
+    for i, request in enumerate(requests):
+        try:
+            request_text = request.decode("utf-8")
+            if (request_match := REQUEST_PATTERN.match(request_text)) is None:
+                raise ValueError(f"Error in {request!r}")
+        except ValueError as ex:
+            responses[i] = repr(ex).encode("utf-8")
+            continue
+        key = (request_match.group(1), request_match.group(3))
+        count = int(request_match.group(2))
+        groups.setdefault(key, []).append((i, request_text, count))
+
+    for (model_name, dice_text), members in groups.items():
+        try:
+            dice = implementations[model_name].from_text(dice_text)
+            numbers = dice.roll_many(sum(count for _, _, count in members), rng)
+        except (ValueError, KeyError) as ex:
+            for i, _, _ in members:
+                responses[i] = repr(ex).encode("utf-8")
+            continue
+        start = 0
+        for i, request_text, count in members:
+            response = f"{request_text} = {numbers[start : start + count]}"
+            responses[i] = response.encode("utf-8")
+            start += count
+    return responses
+
+
 test_dice = """
 >>> import random
 >>> random.seed(42)
@@ -136,6 +344,44 @@ test_dice = """
 
 """
 
+test_roll_result = """
+>>> import random
+>>> random.seed(42)
+>>> d_1 = Dice.from_text("4d6k3+1")
+>>> result = d_1.roll_result()
+>>> result, result.total
+(RollResult([1, 1, 6], 1), 9)
+
+One ``Dice`` shared by many threads: every roll gets its own result.
+
+>>> from concurrent.futures import ThreadPoolExecutor
+>>> d_2 = Dice.from_text("6d6d2k3")
+>>> with ThreadPoolExecutor(8) as pool:
+...     results = list(pool.map(lambda _: d_2.roll_result(), range(2000)))
+>>> all(len(r.dice) == 3 and r.dice == sorted(r.dice) for r in results)
+True
+>>> hasattr(d_2, "dice")
+False
+
+"""
+
+test_parse_dice = """
+>>> parse_dice("3d6d1+2")
+DiceSpec(n=3, d=6, adjustments=(Drop(1), Plus(2)))
+>>> parse_dice("d20")
+DiceSpec(n=1, d=20, adjustments=())
+>>> parse_dice("4d6k3") is parse_dice("4d6k3")
+True
+>>> d_1, d_2 = Dice.from_text("4d6k3"), Dice.from_text("4d6k3")
+>>> d_1 is d_2, d_1.adjustments[1:] == d_2.adjustments[1:]
+(False, True)
+>>> parse_dice("six")
+Traceback (most recent call last):
+...
+ValueError: Error in 'six'
+
+"""
+
 test_dice_roller = """
 >>> import random
 >>> random.seed(42)
@@ -144,4 +390,139 @@ b'Dice 6 4d6d1 = [13, 7, 18, 14, 4, 12]'
 
 """
 
+test_roll_many = """
+>>> import random
+>>> for text in ["4d6k3", "4d6d1", "3d8+2", "2d20d1-1", "d100", "5d7"]:
+...     dice = Dice.from_text(text)
+...     random.seed(42)
+...     scalar = [dice.roll() for _ in range(1000)]
+...     following = random.random()
+...     random.seed(42)
+...     assert dice.roll_many(1000) == scalar, text
+...     assert random.random() == following, text
+>>> random.seed(42)
+>>> dice = Dice.from_text("4d6k3")
+>>> [dice.roll(), *dice.roll_many(3), dice.roll()]
+[8, 6, 13, 10, 3]
+>>> random.seed(42)
+>>> mixed = [dice.roll(), *dice.roll_many(200), dice.roll()]
+>>> random.seed(42)
+>>> mixed == [dice.roll() for _ in range(202)]
+True
+>>> dice.roll_many(0)
+[]
+>>> random.seed(42)
+>>> batch = Dice2(2, 6).roll_many(300)
+>>> random.seed(42)
+>>> batch == [Dice2(2, 6).roll() for _ in range(300)]
+True
+>>> dice_roller(b"Dice 1 d0")  # doctest: +ELLIPSIS
+Traceback (most recent call last):
+...
+ValueError: empty range ...
+>>> dice_roller(b"Dice 500 d0")  # doctest: +ELLIPSIS
+Traceback (most recent call last):
+...
+ValueError: empty range ...
+
+Totals too big for int64 are still exact.
+
+>>> big = Dice.from_text("4d4611686018427387904").roll_many(100)
+>>> all(4 <= total <= 4 * 4611686018427387904 for total in big)
+True
+>>> min(Dice.from_text("4d6+9223372036854775807").roll_many(100)) > 2**63
+True
+>>> response = dice_roller(b"Dice 200 d99999999999999999999999")
+>>> totals = [int(t) for t in response.split(b"[")[1].rstrip(b"]").split(b", ")]
+>>> len(totals), all(1 <= t <= 99999999999999999999999 for t in totals)
+(200, True)
+
+"""
+
+test_dice_roller_stream = """
+>>> import random
+>>> for request in [b"Dice 6 4d6d1", b"Dice 0 d6", b"Dice2 1000 2d6"]:
+...     random.seed(42)
+...     pieces = list(dice_roller_stream(request, size=300))
+...     random.seed(42)
+...     print(len(pieces), b"".join(pieces) == dice_roller(request))
+2 True
+1 True
+5 True
+>>> next(dice_roller_stream(b"Dice 1 d0"))  # doctest: +ELLIPSIS
+Traceback (most recent call last):
+...
+ValueError: empty range ...
+
+"""
+
+test_dice_roller_batch = """
+>>> import random
+>>> requests = [b"Dice 6 4d6d1", b"Dice 3 4d6d1", b"Dice2 2 2d6", b"Dice 1 6"]
+>>> random.seed(42)
+>>> responses = dice_roller_batch(requests)
+>>> for response in responses:
+...     print(response.decode("utf-8"))
+Dice 6 4d6d1 = [13, 7, 18, 14, 4, 12]
+Dice 3 4d6d1 = [17, 15, 12]
+Dice2 2 2d6 = [8, 7]
+ValueError("Error in '6'")
+
+The same requests one at a time, with the same seed:
+
+>>> random.seed(42)
+>>> [dice_roller(r) for r in requests[:3]] == responses[:3]
+True
+>>> for response in dice_roller_batch([b"Die 1 d6", b"nonsense", b"Dice 1 d0"]):
+...     print(response.decode("utf-8"))  # doctest: +ELLIPSIS
+KeyError('Die')
+ValueError("Error in b'nonsense'")
+ValueError('empty range ...')
+
+"""
+
 __test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
+
+
+def benchmark(
+    threads: int = 8, requests: int = 200, count: int = 100, dice_text: str = "4d6k3"
+) -> None:
+    """Rolls per second from each random source, with ``threads`` rolling at once.
+
+    Each request rolls ``count`` times, one ``roll()`` at a time or with
+    ``roll_many()``. Sources are built per request, so a shared source is
+    simply returned every time.
+    """
+    dice = Dice.from_text(dice_text)
+    thread_local = ThreadLocalRandom()
+    sources: dict[str, Callable[[int], RandomSource]] = {
+        "global random": lambda request: GLOBAL_RANDOM,
+        "per-thread Random": lambda request: thread_local,
+        "per-request Random": lambda request: PythonRandom(random.Random(request)),
+    }
+    if numpy is not None:
+        pcg, philox = NumpyRandom("PCG64"), NumpyRandom("Philox")
+        sources["numpy PCG64"] = lambda request: pcg
+        sources["numpy Philox"] = lambda request: philox
+
+    for name, source in sources.items():
+        for method in ("roll", "roll_many"):
+
+            def serve(request: int) -> None:
+                rng = source(request)
+                if method == "roll":
+                    for _ in range(count):
+                        dice.roll(rng)
+                else:
+                    dice.roll_many(count, rng)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(serve, range(requests)))
+            elapsed = time.perf_counter() - start
+            rate = requests * count / elapsed
+            print(f"{name:20s} {method:10s} {rate:12,.0f} rolls/s")
+
+
+if __name__ == "__main__":
+    benchmark()
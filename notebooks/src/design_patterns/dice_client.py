@@ -0,0 +1,363 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import queue
+import socket
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence, Union
+from dice_compression import (
+    CODECS,
+    CONTENT,
+    Codec,
+    accept_frame,
+    decode_tagged,
+)
+from dice_protocol import FrameError, encode_frame, frame_size, read_frame_async
+from dice_server import Address
+from dice_service import LoadReport
+from socket_client import pipeline, unzip
+
+Request = Union[str, bytes]
+
+
+def _encode(request: Request) -> bytes:
+    frame = request.encode("utf-8") if isinstance(request, str) else request
+    frame_size(len(frame))
+    return frame
+
+
+def decode_response(response: bytes, codec: Optional[Codec] = None) -> str:
+    """With a negotiated ``codec``, every response is tagged. Without one,
+    successful rolls arrive gzipped and errors arrive as plain text."""
+    if codec is not None:
+        return decode_tagged(response, codec).decode("utf-8")
+    return unzip(response)
+
+
+def negotiated(reply: bytes) -> Optional[Codec]:
+    """The codec a server picked, or ``None`` if it doesn't negotiate."""
+    if reply.startswith(CONTENT):
+        return CODECS[reply[len(CONTENT) :].decode("ascii")]
+    return None
+
+
+class DiceClient:
+    """A thread-safe client for a framed dice service.
+
+    At most ``pool_size`` connections are open at once; a caller that
+    needs one while they're all busy waits for one to come back. A request
+    that fails on a broken or timed-out connection is retried on a fresh
+    one, up to ``retries`` times. Each retry is a new roll. A request too
+    large for a frame fails at once, since no retry could send it.
+
+    A new connection offers the codecs in ``accept``, best first, and
+    uses whichever the server picks. An empty ``accept`` skips that.
+    """
+
+    def __init__(
+        self,
+        address: Address,
+        pool_size: int = 8,
+        timeout: float = 5.0,
+        retries: int = 2,
+        accept: Sequence[str] = tuple(CODECS),
+    ) -> None:
+        self.address = address
+        self.timeout = timeout
+        self.retries = retries
+        self.accept = accept
+        self.slots = threading.BoundedSemaphore(pool_size)
+        self.idle: queue.LifoQueue[socket.socket] = queue.LifoQueue()
+        self.codecs: dict[socket.socket, Optional[Codec]] = {}
+
+    def open(self) -> socket.socket:
+        server = socket.create_connection(self.address, self.timeout)
+        codec = None
+        if self.accept:
+            try:
+                (reply,) = pipeline(server, [accept_frame(self.accept)])
+            except BaseException:
+                server.close()
+                raise
+            codec = negotiated(reply)
+        self.codecs[server] = codec
+        return server
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[socket.socket]:
+        """Borrow a pooled connection. If the body fails, it's discarded."""
+        with self.slots:
+            try:
+                server = self.idle.get_nowait()
+            except queue.Empty:
+                server = self.open()
+            try:
+                yield server
+            except BaseException:
+                self.codecs.pop(server, None)
+                server.close()
+                raise
+            self.idle.put(server)
+
+    def roll(self, request: Request) -> str:
+        return self.roll_many([request])[0]
+
+    def roll_many(self, requests: Sequence[Request], window: int = 64) -> list[str]:
+        """Pipeline ``requests`` over one connection; responses in order."""
+        frames = [_encode(r) for r in requests]
+        for attempt in range(self.retries + 1):
+            try:
+                with self.connection() as server:
+                    responses = list(pipeline(server, frames, window))
+                    codec = self.codecs[server]
+                return [decode_response(r, codec) for r in responses]
+            except (OSError, FrameError):
+                if attempt == self.retries:
+                    raise
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        while True:
+            try:
+                server = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self.codecs.pop(server, None)
+            server.close()
+
+    def __enter__(self) -> "DiceClient":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+class AsyncConnection:
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.codec: Optional[Codec] = None
+
+    async def negotiate(self, accept: Sequence[str]) -> None:
+        if accept:
+            (reply,) = await self.pipeline([accept_frame(accept)])
+            self.codec = negotiated(reply)
+
+    async def pipeline(self, requests: Sequence[bytes]) -> list[bytes]:
+        """Write every request while reading the responses.
+
+        Reading at the same time keeps the server from blocking on a full
+        send buffer while the client is still writing.
+        """
+
+        async def send() -> None:
+            for request in requests:
+                self.writer.write(encode_frame(request))
+                await self.writer.drain()
+
+        sender = asyncio.create_task(send())
+        try:
+            responses = []
+            for _ in requests:
+                if (response := await read_frame_async(self.reader)) is None:
+                    raise ConnectionError("Server closed the connection")
+                responses.append(response)
+            await sender
+        finally:
+            sender.cancel()
+        return responses
+
+    async def close(self) -> None:
+        self.writer.close()
+        with contextlib.suppress(ConnectionError):
+            await self.writer.wait_closed()
+
+
+class AsyncDiceClient:
+    """:class:`DiceClient` for asyncio.
+
+    Thousands of concurrent :meth:`roll` calls share ``pool_size``
+    connections; each round trip is bounded by ``timeout``.
+    """
+
+    def __init__(
+        self,
+        address: Address,
+        pool_size: int = 8,
+        timeout: float = 5.0,
+        retries: int = 2,
+        accept: Sequence[str] = tuple(CODECS),
+    ) -> None:
+        self.address = address
+        self.timeout = timeout
+        self.retries = retries
+        self.accept = accept
+        self.slots = asyncio.Semaphore(pool_size)
+        self.idle: list[AsyncConnection] = []
+
+    @contextlib.asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncConnection]:
+        async with self.slots:
+            if self.idle:
+                connection = self.idle.pop()
+            else:
+                connection = AsyncConnection(
+                    *await asyncio.open_connection(*self.address)
+                )
+                try:
+                    await asyncio.wait_for(
+                        connection.negotiate(self.accept), self.timeout
+                    )
+                except BaseException:
+                    await connection.close()
+                    raise
+            try:
+                yield connection
+            except BaseException:
+                await connection.close()
+                raise
+            self.idle.append(connection)
+
+    async def roll(self, request: Request) -> str:
+        return (await self.roll_many([request]))[0]
+
+    async def roll_many(self, requests: Sequence[Request]) -> list[str]:
+        frames = [_encode(r) for r in requests]
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.connection() as connection:
+                    responses = await asyncio.wait_for(
+                        connection.pipeline(frames), self.timeout
+                    )
+                return [decode_response(r, connection.codec) for r in responses]
+            except (OSError, FrameError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+        raise AssertionError("unreachable")
+
+    async def close(self) -> None:
+        while self.idle:
+            await self.idle.pop().close()
+
+    async def __aenter__(self) -> "AsyncDiceClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+
+async def load_test(
+    address: Address,
+    requests: int = 10_000,
+    pool_size: int = 8,
+    request: Request = "Dice 6 4d6d1",
+) -> LoadReport:
+    """Fire ``requests`` concurrent rolls at a framed server."""
+
+    async def timed(client: AsyncDiceClient) -> Optional[float]:
+        start = time.perf_counter()
+        try:
+            await client.roll(request)
+        except (OSError, FrameError, asyncio.TimeoutError):
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    async with AsyncDiceClient(address, pool_size, timeout=30.0) as client:
+        results = await asyncio.gather(*(timed(client) for _ in range(requests)))
+    seconds = time.perf_counter() - start
+    latencies = [r for r in results if r is not None]
+    return LoadReport(len(latencies), len(results) - len(latencies), seconds, latencies)
+
+
+def main(host: str = "localhost", port: str = "2401", requests: str = "10000") -> None:
+    report = asyncio.run(load_test((host, int(port)), int(requests)))
+    print(report)
+
+
+test_dice_client = """
+>>> import random
+>>> from dice_service import ServerConfig, start
+>>> random.seed(42)
+>>> server, thread = start("threads", ServerConfig(port=0, framed=True))
+>>> with DiceClient(server.address, pool_size=2) as client:
+...     print(client.roll("Dice 6 4d6d1"))
+...     print(client.roll(b"Dice 1 six"))
+...     responses = client.roll_many([f"Dice {n} d6" for n in range(1, 101)])
+Dice 6 4d6d1 = [13, 7, 18, 14, 4, 12]
+ValueError("Error in 'six'")
+>>> [r.count(",") + 1 for r in responses] == list(range(1, 101))
+True
+
+A connection the server has dropped is replaced, and the request retried.
+
+>>> client = DiceClient(server.address, pool_size=1)
+>>> client.roll("Dice 1 d6")[:12]
+'Dice 1 d6 = '
+>>> client.idle.queue[0].shutdown(socket.SHUT_RDWR)
+>>> client.roll("Dice 1 d6")[:12]
+'Dice 1 d6 = '
+>>> client.close()
+
+A response too large for a frame comes back as an error on a connection
+that stays open. A request too large for one fails without a retry.
+
+>>> client = DiceClient(server.address, accept=["identity"])
+>>> client.roll("Dice 6000000 d6")
+"FrameError('Response over 16777216 bytes')"
+>>> client.roll("Dice 1 d6")[:12], len(client.codecs)
+('Dice 1 d6 = ', 1)
+>>> client.roll(b"Dice 1 d6" + bytes(16 * 1024 * 1024))
+Traceback (most recent call last):
+...
+dice_protocol.FrameError: Frame of 16777225 bytes is too large
+>>> len(client.codecs)
+1
+>>> client.close()
+
+>>> async def concurrent(count):
+...     async with AsyncDiceClient(server.address, pool_size=4) as client:
+...         return await asyncio.gather(
+...             *(client.roll(f"Dice {n % 5 + 1} d6") for n in range(count))
+...         )
+>>> responses = asyncio.run(concurrent(1000))
+>>> len(responses), responses[7]  # doctest: +ELLIPSIS
+(1000, 'Dice 3 d6 = ...')
+
+Connections use the codec the server picks from those offered; a client
+that offers none gets the gzipped responses of a client that can't ask.
+
+>>> with DiceClient(server.address, accept=["brotli", "deflate"]) as client:
+...     print(client.roll("Dice 2 d6")[:12], client.roll("Dice 200 d6").count(","))
+...     print([codec.name for codec in client.codecs.values()])
+Dice 2 d6 =  199
+['deflate']
+>>> with DiceClient(server.address, accept=()) as client:
+...     print(client.roll("Dice 200 d6").count(","), client.codecs)
+... # doctest: +ELLIPSIS
+199 {<socket.socket ...>: None}
+
+>>> report = asyncio.run(load_test(server.address, requests=500, pool_size=4))
+>>> report.requests, report.errors
+(500, 0)
+
+>>> server.shutdown()
+>>> thread.join()
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
+
+if __name__ == "__main__":
+    import sys
+
+    main(*sys.argv[1:])
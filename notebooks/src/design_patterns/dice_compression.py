@@ -0,0 +1,242 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import time
+import zlib
+from typing import Iterable, Iterator, Optional, Protocol, Sequence, Union
+
+# Either may be missing, or installed without type information.
+try:
+    import lz4.frame  # type: ignore [import-not-found, import-untyped, unused-ignore]
+except ImportError:
+    lz4 = None  # type: ignore [assignment, unused-ignore]
+
+try:
+    import zstandard  # type: ignore [import-not-found, import-untyped, unused-ignore]
+except ImportError:
+    zstandard = None  # type: ignore [assignment, unused-ignore]
+
+# Big responses are compressed and sent this much at a time.
+CHUNK_SIZE = 64 * 1024
+
+# A framed client offers codecs in its first frame; the server answers
+# with the one it picked, and tags every response after that.
+ACCEPT = b"Accept-Encoding: "
+CONTENT = b"Content-Encoding: "
+PLAIN = b"\x00"
+COMPRESSED = b"\x01"
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+Buffer = Union[bytes, memoryview]
+
+
+class Compressor(Protocol):
+    def compress(self, data: Buffer) -> bytes:
+        ...
+
+    def flush(self) -> bytes:
+        ...
+
+
+class Codec:
+    """One compression format: a streaming compressor, and a decompressor."""
+
+    name = "identity"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def compressor(self, level: int) -> Compressor:
+        return Identity()
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+    def stream(self, data: bytes, level: int) -> Iterator[bytes]:
+        """Compress ``data`` a chunk at a time, never holding all the output."""
+        return self.stream_pieces([data], level)
+
+    def stream_pieces(self, pieces: Iterable[bytes], level: int) -> Iterator[bytes]:
+        """Compress data that arrives in ``pieces``, as each one arrives."""
+        compressor = self.compressor(level)
+        for piece in pieces:
+            view = memoryview(piece)
+            for start in range(0, len(piece), CHUNK_SIZE):
+                if chunk := compressor.compress(view[start : start + CHUNK_SIZE]):
+                    yield chunk
+        if tail := compressor.flush():
+            yield tail
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        return b"".join(self.stream(data, level))
+
+
+class Identity:
+    def compress(self, data: Buffer) -> bytes:
+        return bytes(data)
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class Gzip(Codec):
+    """``zlib`` writing the gzip container, the format ``ZipRoller`` always used."""
+
+    name = "gzip"
+    wbits = 16 + zlib.MAX_WBITS
+
+    def compressor(self, level: int) -> Compressor:
+        return zlib.compressobj(level, zlib.DEFLATED, self.wbits)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data, self.wbits)
+
+
+class Deflate(Gzip):
+    """Raw deflate: gzip without its 18 bytes of header and trailer."""
+
+    name = "deflate"
+    wbits = -zlib.MAX_WBITS
+
+
+class LZ4Compressor:
+    def __init__(self, level: int) -> None:
+        self.compressor = lz4.frame.LZ4FrameCompressor(compression_level=level)
+        self.header: Optional[bytes] = self.compressor.begin()
+
+    def compress(self, data: Buffer) -> bytes:
+        header, self.header = self.header or b"", None
+        chunk: bytes = self.compressor.compress(data)
+        return header + chunk
+
+    def flush(self) -> bytes:
+        header, self.header = self.header or b"", None
+        tail: bytes = self.compressor.flush()
+        return header + tail
+
+
+class LZ4(Codec):
+    name = "lz4"
+
+    @property
+    def available(self) -> bool:
+        return lz4 is not None
+
+    def compressor(self, level: int) -> Compressor:
+        return LZ4Compressor(level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lz4.frame.decompress(data)  # type: ignore [no-any-return]
+
+
+class Zstd(Codec):
+    name = "zstd"
+
+    @property
+    def available(self) -> bool:
+        return zstandard is not None
+
+    def compressor(self, level: int) -> Compressor:
+        compressor = zstandard.ZstdCompressor(level=level)
+        return compressor.compressobj()  # type: ignore [no-any-return]
+
+    def decompress(self, data: bytes) -> bytes:
+        # A streamed frame doesn't record its size, which decompress() needs.
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        return decompressor.decompress(data)  # type: ignore [no-any-return]
+
+
+# Everything this process can speak, best first.
+CODECS: dict[str, Codec] = {
+    codec.name: codec
+    for codec in [Zstd(), LZ4(), Gzip(), Deflate(), Codec()]
+    if codec.available
+}
+
+
+def negotiate(offered: Iterable[str]) -> Codec:
+    """The first of the client's ``offered`` codecs we have, else identity."""
+    for name in offered:
+        if name in CODECS:
+            return CODECS[name]
+    return CODECS["identity"]
+
+
+def accept_frame(codecs: Sequence[str]) -> bytes:
+    return ACCEPT + ", ".join(codecs).encode("ascii")
+
+
+def parse_accept(frame: bytes) -> list[str]:
+    return [name.strip() for name in frame[len(ACCEPT) :].decode("ascii").split(",")]
+
+
+def decode_tagged(response: bytes, codec: Codec) -> bytes:
+    """Undo the tag a negotiated connection puts on every response."""
+    tag, body = response[:1], response[1:]
+    if tag == COMPRESSED:
+        return codec.decompress(body)
+    if tag == PLAIN:
+        return body
+    raise ValueError(f"Unknown response tag {tag!r}")
+
+
+def benchmark(
+    sizes: Sequence[int] = (40, 4_000, 400_000), levels: Sequence[int] = (1, 6, 9)
+) -> None:
+    """Compressed size and time for each codec and level, for roll-like data."""
+    sample = b"Dice 6 4d6d1 = [13, 7, 18, 14, 4, 12]\n"
+    for size in sizes:
+        data = (sample * (size // len(sample) + 1))[:size]
+        for codec in CODECS.values():
+            for level in levels if codec.name != "identity" else levels[:1]:
+                start = time.perf_counter()
+                packed = codec.compress(data, level)
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{size:8,d} bytes {codec.name:8s} level {level}: "
+                    f"{len(packed):8,d} bytes in {elapsed * 1_000_000:8.1f} µs"
+                )
+
+
+test_codecs = """
+>>> data = b"Dice 6 4d6d1 = [13, 7, 18, 14, 4, 12]" * 5000
+>>> for name in ["gzip", "deflate", "identity"]:
+...     codec = CODECS[name]
+...     packed = codec.compress(data, level=6)
+...     chunks = list(codec.stream(data, level=1))
+...     print(name, len(packed) < 2_000 or name == "identity",
+...           codec.decompress(packed) == codec.decompress(b"".join(chunks)) == data)
+gzip True True
+deflate True True
+identity True True
+>>> CODECS["gzip"].compress(b"x", 6).startswith(GZIP_MAGIC)
+True
+>>> len(CODECS["gzip"].compress(data, 6)) - len(CODECS["deflate"].compress(data, 6))
+18
+>>> pieces = [data[i : i + 70_000] for i in range(0, len(data), 70_000)]
+>>> packed = b"".join(CODECS["gzip"].stream_pieces(iter(pieces), level=6))
+>>> CODECS["gzip"].decompress(packed) == data
+True
+
+>>> negotiate(parse_accept(accept_frame(["brotli", "deflate", "gzip"]))).name
+'deflate'
+>>> negotiate(["brotli"]).name
+'identity'
+>>> decode_tagged(COMPRESSED + CODECS["gzip"].compress(b"hi", 6), CODECS["gzip"])
+b'hi'
+>>> decode_tagged(PLAIN + b"hi", CODECS["gzip"])
+b'hi'
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
+
+if __name__ == "__main__":
+    benchmark()
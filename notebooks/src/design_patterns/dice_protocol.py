@@ -0,0 +1,129 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import asyncio
+import struct
+from typing import BinaryIO, Optional, Union
+
+# Every frame is a 4-byte big-endian length, then that many bytes.
+# Gzipped responses are binary, so a delimiter wouldn't be safe.
+LENGTH = struct.Struct("!I")
+MAX_FRAME = 16 * 1024 * 1024
+
+
+class FrameError(ValueError):
+    pass
+
+
+def frame_size(length: int) -> int:
+    """``length``, if a payload that long fits in one frame."""
+    if length > MAX_FRAME:
+        raise FrameError(f"Frame of {length} bytes is too large")
+    return length
+
+
+def encode_frame(payload: bytes) -> bytes:
+    return LENGTH.pack(frame_size(len(payload))) + payload
+
+
+def _length(header: Union[bytes, bytearray]) -> int:
+    (length,) = LENGTH.unpack(header)
+    return frame_size(length)
+
+
+def read_frame(stream: BinaryIO) -> Optional[bytes]:
+    """The next frame from a blocking stream, or ``None`` at a clean end."""
+    header = stream.read(LENGTH.size)
+    if not header:
+        return None
+    if len(header) < LENGTH.size:
+        raise FrameError("Connection closed inside a frame header")
+    length = _length(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        raise FrameError("Connection closed inside a frame")
+    return payload
+
+
+async def read_frame_async(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """Like :func:`read_frame`, for an asyncio stream."""
+    try:
+        header = await reader.readexactly(LENGTH.size)
+    except asyncio.IncompleteReadError as ex:
+        if ex.partial:
+            raise FrameError("Connection closed inside a frame header") from ex
+        return None
+    try:
+        return await reader.readexactly(_length(header))
+    except asyncio.IncompleteReadError as ex:
+        raise FrameError("Connection closed inside a frame") from ex
+
+
+class FrameDecoder:
+    """Collects frames from data that arrives in arbitrary pieces."""
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> list[bytes]:
+        self.buffer += data
+        frames = []
+        start = 0
+        while len(self.buffer) - start >= LENGTH.size:
+            length = _length(self.buffer[start : start + LENGTH.size])
+            end = start + LENGTH.size + length
+            if len(self.buffer) < end:
+                break
+            frames.append(bytes(self.buffer[start + LENGTH.size : end]))
+            start = end
+        del self.buffer[:start]
+        return frames
+
+    @property
+    def pending(self) -> bool:
+        """True while part of a frame is waiting for the rest."""
+        return bool(self.buffer)
+
+
+test_frames = """
+>>> import io
+>>> stream = io.BytesIO(
+...     encode_frame(b"Dice 3 d6") + encode_frame(b"") + encode_frame(b"x" * 5000)
+... )
+>>> [len(read_frame(stream)) for _ in range(3)], read_frame(stream)
+([9, 0, 5000], None)
+>>> read_frame(io.BytesIO(encode_frame(b"Dice 3 d6")[:-1]))
+... # doctest: +IGNORE_EXCEPTION_DETAIL
+Traceback (most recent call last):
+...
+dice_protocol.FrameError: Connection closed inside a frame
+
+>>> data = encode_frame(b"first") + encode_frame(b"second")
+>>> decoder = FrameDecoder()
+>>> [decoder.feed(data[i : i + 3]) for i in range(0, len(data), 3)]
+[[], [], [b'first'], [], [], [], [b'second']]
+>>> decoder.pending
+False
+>>> decoder.feed(LENGTH.pack(MAX_FRAME + 1))  # doctest: +IGNORE_EXCEPTION_DETAIL
+Traceback (most recent call last):
+...
+dice_protocol.FrameError: Frame of 16777217 bytes is too large
+
+>>> async def read_all(data):
+...     reader = asyncio.StreamReader()
+...     reader.feed_data(data)
+...     reader.feed_eof()
+...     return [frame async for frame in frames(reader)]
+>>> async def frames(reader):
+...     while (frame := await read_frame_async(reader)) is not None:
+...         yield frame
+>>> asyncio.run(read_all(data))
+[b'first', b'second']
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
@@ -0,0 +1,243 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import itertools
+import random
+import threading
+from typing import Any, Optional, Protocol
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore [assignment]
+
+
+class RandomSource(Protocol):
+    """Where a :class:`dice.Roll` gets its numbers."""
+
+    def randints(self, d: int, n: int) -> list[int]:
+        """``n`` numbers from 1 to ``d``, for one roll."""
+        ...
+
+    def randint_array(self, d: int, size: int) -> Any:
+        """A NumPy array of ``size`` numbers from 1 to ``d``, for many rolls."""
+        ...
+
+
+# Each thread's MT19937, reused: its state is overwritten on every call,
+# so seeding a new one from OS entropy each time would be wasted work.
+_generators = threading.local()
+
+
+def _mt19937() -> Any:
+    try:
+        return _generators.mt19937
+    except AttributeError:
+        _generators.mt19937 = numpy.random.MT19937(0)
+        return _generators.mt19937
+
+
+def _randint_many(rng: Any, d: int, size: int) -> Any:
+    """Draw ``size`` values as ``rng.randint(1, d)`` would, in one go.
+
+    ``rng`` is ``random`` or a ``random.Random``: a Mersenne Twister, so
+    NumPy's ``MT19937`` can take over its state, generate the 32-bit words
+    in bulk, and apply the rejection sampling of ``Random._randbelow()`` to
+    all of them. ``rng`` is then moved past exactly the words used: under a
+    given seed the scalar and vectorized paths give the same numbers, and
+    can be interleaved.
+    """
+    bits = d.bit_length()
+    if d < 1 or bits > 32:
+        # randint() raises the usual ValueError for an empty range. Past
+        # int64, the array holds Python ints.
+        dtype = object if bits > 63 else numpy.int64
+        return numpy.array([rng.randint(1, d) for _ in range(size)], dtype=dtype)
+    version, internal, gauss_next = rng.getstate()
+    key = numpy.array(internal[:-1], dtype=numpy.uint32)
+    start: Any = {
+        "bit_generator": "MT19937",
+        "state": {"key": key, "pos": internal[-1]},
+    }
+    generator = _mt19937()
+    generator.state = start
+    words = numpy.zeros(0, dtype=numpy.uint64)
+    accepted = numpy.zeros(0, dtype=numpy.int64)
+    while len(accepted) < size:
+        # Enough for the expected rejections, plus a little.
+        more = (size - len(accepted)) * (1 << bits) // d + 64
+        words = numpy.concatenate([words, generator.random_raw(more) >> (32 - bits)])
+        accepted = numpy.flatnonzero(words < d)
+    used = int(accepted[size - 1]) + 1 if size else 0
+    generator.state = start
+    generator.random_raw(used)
+    state = generator.state["state"]
+    rng.setstate((version, (*state["key"].tolist(), state["pos"]), gauss_next))
+    return words[accepted[:size]].astype(numpy.int64) + 1
+
+
+class PythonRandom:
+    """Numbers from one ``random.Random``.
+
+    ``PythonRandom(random.Random(seed))`` gives a request its own
+    reproducible stream; don't share one between threads.
+    """
+
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+
+    def randints(self, d: int, n: int) -> list[int]:
+        randint = self.rng.randint
+        return [randint(1, d) for _ in range(n)]
+
+    def randint_array(self, d: int, size: int) -> Any:
+        return _randint_many(self.rng, d, size)
+
+
+class GlobalRandom(PythonRandom):
+    """The module-level ``random`` functions: what ``random.seed()`` controls.
+
+    Every thread shares the one generator. :meth:`randint_array` copies its
+    state out and back, so draws through this source are serialized; any
+    other thread calling ``random`` directly meanwhile may repeat numbers.
+    """
+
+    lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self.rng = random  # type: ignore [assignment]
+
+    def randints(self, d: int, n: int) -> list[int]:
+        with self.lock:
+            return super().randints(d, n)
+
+    def randint_array(self, d: int, size: int) -> Any:
+        with self.lock:
+            return super().randint_array(d, size)
+
+
+class ThreadLocalRandom:
+    """A ``random.Random`` for each thread, so threads don't share a generator.
+
+    With a ``seed``, the n-th thread to roll gets the stream seeded by
+    ``f"{seed}/{n}"``.
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.seed = seed
+        self.local = threading.local()
+        self.threads = itertools.count()
+
+    def source(self) -> PythonRandom:
+        try:
+            return self.local.source  # type: ignore [no-any-return]
+        except AttributeError:
+            seed = None if self.seed is None else f"{self.seed}/{next(self.threads)}"
+            self.local.source = PythonRandom(random.Random(seed))
+            return self.local.source  # type: ignore [no-any-return]
+
+    def randints(self, d: int, n: int) -> list[int]:
+        return self.source().randints(d, n)
+
+    def randint_array(self, d: int, size: int) -> Any:
+        return self.source().randint_array(d, size)
+
+
+class NumpyRandom:
+    """A NumPy ``Generator`` for each thread, built on ``bit_generator``.
+
+    The per-thread generators come from ``SeedSequence.spawn()``, so their
+    streams are independent, and reproducible for a given ``seed``.
+    """
+
+    def __init__(
+        self, bit_generator: str = "PCG64", seed: Optional[int] = None
+    ) -> None:
+        self.bit_generator = getattr(numpy.random, bit_generator)
+        self.seed_sequence = numpy.random.SeedSequence(seed)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def generator(self) -> Any:
+        try:
+            return self.local.generator
+        except AttributeError:
+            with self.lock:
+                (child,) = self.seed_sequence.spawn(1)
+            self.local.generator = numpy.random.Generator(self.bit_generator(child))
+            return self.local.generator
+
+    def randints(self, d: int, n: int) -> list[int]:
+        return self.randint_array(d, n).tolist()  # type: ignore [no-any-return]
+
+    def randint_array(self, d: int, size: int) -> Any:
+        return self.generator().integers(1, d, size=size, endpoint=True)
+
+
+GLOBAL_RANDOM = GlobalRandom()
+
+
+test_random_sources = """
+>>> import random
+>>> random.seed(42)
+>>> expected = [random.randint(1, 6) for _ in range(5)]
+>>> random.seed(42)
+>>> GLOBAL_RANDOM.randints(6, 5) == expected
+True
+>>> PythonRandom(random.Random(42)).randints(6, 5) == expected
+True
+>>> request = PythonRandom(random.Random(42))
+>>> request.randint_array(6, 5).tolist() == expected
+True
+
+Seeded per-thread streams are reproducible whichever thread starts first.
+
+>>> def per_thread(source, threads=4):
+...     results = []
+...     workers = [
+...         threading.Thread(target=lambda: results.append(source.randints(20, 3)))
+...         for _ in range(threads)
+...     ]
+...     for worker in workers:
+...         worker.start()
+...     for worker in workers:
+...         worker.join()
+...     return sorted(results)
+>>> first = per_thread(ThreadLocalRandom(seed=7))
+>>> first == per_thread(ThreadLocalRandom(seed=7)), len(set(map(tuple, first)))
+(True, 4)
+>>> pcg = NumpyRandom("PCG64", seed=7)
+>>> values = pcg.randint_array(6, 10_000)
+>>> int(values.min()), int(values.max())
+(1, 6)
+>>> philox = [NumpyRandom("Philox", seed=7).randints(6, 3) for _ in range(2)]
+>>> philox[0] == philox[1]
+True
+
+An empty range is a ValueError, as from ``randint()``.
+
+>>> GLOBAL_RANDOM.randint_array(0, 3)  # doctest: +ELLIPSIS
+Traceback (most recent call last):
+...
+ValueError: empty range ...
+>>> huge = PythonRandom(random.Random(42)).randint_array(10**30, 100)
+>>> huge.dtype, all(1 <= n <= 10**30 for n in huge)
+(dtype('O'), True)
+
+Threads sharing the global stream never get the same numbers.
+
+>>> from concurrent.futures import ThreadPoolExecutor
+>>> def batches(_):
+...     return [tuple(GLOBAL_RANDOM.randint_array(6, 50)) for _ in range(200)]
+>>> with ThreadPoolExecutor(8) as pool:
+...     draws = [batch for thread in pool.map(batches, range(8)) for batch in thread]
+>>> len(draws), len(set(draws))
+(1600, 1600)
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
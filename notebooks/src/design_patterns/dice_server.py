@@ -5,23 +5,53 @@ Chapter 11. Common Design Patterns
 """
 import contextlib
 import dice
-import gzip
-import io
+import itertools
 import socket
-from typing import cast, Callable, Tuple
+from typing import cast, Callable, Iterator, Tuple
+from dice_compression import CODECS, COMPRESSED, PLAIN
 
 
 class ZipRoller:
-    def __init__(self, dice: Callable[[bytes], bytes]) -> None:
+    """Compress what ``dice`` returns with ``codec`` at ``level``.
+
+    A response shorter than ``threshold`` bytes isn't worth compressing
+    and goes out as is. With ``tagged``, every response starts with
+    ``PLAIN`` or ``COMPRESSED`` so the client knows which it got; without
+    it, a client must look for the codec's magic number.
+    """
+
+    def __init__(
+        self,
+        dice: Callable[[bytes], bytes],
+        codec: str = "gzip",
+        level: int = 6,
+        threshold: int = 0,
+        tagged: bool = False,
+    ) -> None:
         self.dice_roller = dice
+        self.codec = CODECS[codec]
+        self.level = level
+        self.threshold = threshold
+        self.tagged = tagged
 
     def __call__(self, request: bytes) -> bytes:
-        dice_roller = self.dice_roller
-        response = dice_roller(request)
-        buffer = io.BytesIO()
-        with gzip.GzipFile(fileobj=buffer, mode="w") as zipfile:
-            zipfile.write(response)
-        return buffer.getvalue()
+        return b"".join(self.stream(request))
+
+    def stream(self, request: bytes) -> Iterator[bytes]:
+        """The response in pieces, compressed as it's rolled."""
+        pieces = response_pieces(self.dice_roller, request)
+        # Hold back only enough to know whether it's worth compressing.
+        head = b""
+        for piece in pieces:
+            head += piece
+            if len(head) >= self.threshold:
+                break
+        else:
+            yield PLAIN + head if self.tagged else head
+            return
+        if self.tagged:
+            yield COMPRESSED
+        yield from self.codec.stream_pieces(itertools.chain([head], pieces), self.level)
 
 
 Address = Tuple[str, int]
@@ -39,6 +69,23 @@ class LogRoller:
         print(f"Sending {response!r} to {self.remote_addr}")
         return response
 
+    def stream(self, request: bytes) -> Iterator[bytes]:
+        print(f"Receiving {request!r} from {self.remote_addr}")
+        for piece in response_pieces(self.dice_roller, request):
+            print(f"Sending {piece!r} to {self.remote_addr}")
+            yield piece
+
+
+def response_pieces(
+    dice_roller: Callable[[bytes], bytes], request: bytes
+) -> Iterator[bytes]:
+    """What ``dice_roller`` answers, a piece at a time if it can."""
+    if dice_roller is dice.dice_roller:
+        return dice.dice_roller_stream(request)
+    if isinstance(dice_roller, (ZipRoller, LogRoller)):
+        return dice_roller.stream(request)
+    return iter([dice_roller(request)])
+
 
 def dice_response(client: socket.socket) -> None:
     request = client.recv(1024)
@@ -49,7 +96,7 @@ def dice_response(client: socket.socket) -> None:
         response = roller_2(request)
     except (ValueError, KeyError) as ex:
         response = repr(ex).encode("utf-8")
-    client.send(response)
+    client.sendall(response)
 
 
 import contextlib
@@ -0,0 +1,768 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import abc
+import asyncio
+import collections
+import contextlib
+import math
+import queue
+import selectors
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+import dice
+from dice_compression import (
+    ACCEPT,
+    CODECS,
+    CONTENT,
+    PLAIN,
+    negotiate,
+    parse_accept,
+)
+from dice_protocol import (
+    FrameDecoder,
+    FrameError,
+    MAX_FRAME,
+    encode_frame,
+    read_frame,
+    read_frame_async,
+)
+from dice_server import Address, LogRoller, ZipRoller, response_pieces
+from socket_client import pipeline, recv_all
+
+
+@dataclass
+class ServerConfig:
+    host: str = "localhost"
+    port: int = 2401
+    backlog: int = 128
+    max_connections: int = 64
+    workers: int = 8
+    zip: bool = True
+    level: int = 6
+    # Only for clients that negotiated a codec: the rest expect gzip.
+    threshold: int = 256
+    log: bool = False
+    # Length-prefixed requests, any number per connection, answered in order.
+    framed: bool = False
+    # Unsent bytes past which a connection isn't read until it catches up.
+    high_water: int = 1024 * 1024
+
+
+class Session:
+    """One connection's ZipRoller and LogRoller chain, as in
+    ``dice_server.dice_response``, whichever mode is serving.
+
+    Until the client negotiates, successful responses are gzipped. A
+    framed client can open with an ``Accept-Encoding`` frame; the answer
+    names the codec picked, and from then on responses are tagged, and
+    only those of ``threshold`` bytes or more are compressed.
+
+    A framed response too large for one frame is replaced by an error,
+    the same as a bad request gets; the connection stays open.
+    """
+
+    def __init__(self, config: ServerConfig, remote_addr: Address) -> None:
+        self.config = config
+        self.remote_addr = remote_addr
+        self.tagged = False
+        zip = ZipRoller(dice.dice_roller, level=config.level) if config.zip else None
+        self.use(zip)
+
+    def use(self, zip: Optional[ZipRoller]) -> None:
+        roller: Callable[[bytes], bytes] = zip or dice.dice_roller
+        if self.config.log:
+            roller = LogRoller(roller, remote_addr=self.remote_addr)
+        self.roller = roller
+
+    def negotiate(self, request: bytes) -> bytes:
+        if self.config.zip:
+            codec = negotiate(parse_accept(request))
+        else:
+            codec = CODECS["identity"]
+        self.tagged = True
+        self.use(
+            ZipRoller(
+                dice.dice_roller,
+                codec.name,
+                self.config.level,
+                self.config.threshold,
+                tagged=True,
+            )
+        )
+        return CONTENT + codec.name.encode("ascii")
+
+    def stream(self, request: bytes) -> Iterator[bytes]:
+        """The response in pieces, compressed as it's rolled."""
+        if request.startswith(ACCEPT):
+            yield self.negotiate(request)
+            return
+        try:
+            chunks = response_pieces(self.roller, request)
+            # The first slice is rolled here, so a bad request's errors are caught.
+            first = next(chunks, b"")
+        except (ValueError, KeyError) as ex:
+            yield self.error(ex)
+            return
+        yield first
+        yield from chunks
+
+    def error(self, ex: Exception) -> bytes:
+        error = repr(ex).encode("utf-8")
+        return PLAIN + error if self.tagged else error
+
+    def respond(self, request: bytes) -> bytes:
+        """The whole response; a framed one is abandoned once it can't fit."""
+        response = bytearray()
+        for piece in self.stream(request):
+            response += piece
+            if self.config.framed and len(response) > MAX_FRAME:
+                return self.error(FrameError(f"Response over {MAX_FRAME} bytes"))
+        return bytes(response)
+
+
+class DiceServer(abc.ABC):
+    """One request and one response per connection, as in ``dice_server``,
+    or with ``config.framed`` any number of ``dice_protocol`` frames.
+
+    :meth:`serve_forever` blocks until another thread calls
+    :meth:`shutdown`. Then the server stops accepting, finishes the
+    connections it has, and closes.
+    """
+
+    def __init__(self, config: ServerConfig) -> None:
+        self.config = config
+        self.ready = threading.Event()
+        self.stopping = threading.Event()
+        self.address: Address = (config.host, config.port)
+        self.served = 0
+        self.lock = threading.Lock()
+
+    def listen(self) -> socket.socket:
+        server = socket.create_server((self.config.host, self.config.port))
+        server.listen(self.config.backlog)
+        self.address = server.getsockname()[:2]
+        return server
+
+    @abc.abstractmethod
+    def serve_forever(self) -> None:
+        ...
+
+    def shutdown(self) -> None:
+        self.stopping.set()
+
+
+class ThreadPoolServer(DiceServer):
+    """Each connection is handled by a worker thread.
+
+    Past ``max_connections`` the server stops accepting, and new clients
+    wait in the listen backlog. A framed connection keeps its worker until
+    the client closes it, so ``workers`` also bounds the connections, and
+    clients should pool no more than that.
+    """
+
+    poll_interval = 0.05
+
+    def serve_forever(self) -> None:
+        # A connection accepted beyond the workers would only sit in the
+        # executor's queue; it's better off waiting in the backlog.
+        slots = threading.BoundedSemaphore(
+            min(self.config.max_connections, self.config.workers)
+        )
+        self.clients: set[socket.socket] = set()
+        with self.listen() as server, ThreadPoolExecutor(
+            self.config.workers
+        ) as executor:
+            server.settimeout(self.poll_interval)
+            self.ready.set()
+            while not self.stopping.is_set():
+                if not slots.acquire(timeout=self.poll_interval):
+                    continue
+                try:
+                    client, addr = server.accept()
+                except socket.timeout:
+                    slots.release()
+                    continue
+                client.settimeout(None)
+                with self.lock:
+                    self.clients.add(client)
+                future = executor.submit(self.handle, client, addr)
+                future.add_done_callback(lambda _: slots.release())
+            with self.lock:
+                for client in self.clients if self.config.framed else ():
+                    # Whatever a framed client sends from now on is ignored.
+                    with contextlib.suppress(OSError):
+                        client.shutdown(socket.SHUT_RD)
+
+    def handle(self, client: socket.socket, addr: Address) -> None:
+        try:
+            self.serve_client(client, addr)
+        finally:
+            with self.lock:
+                self.clients.discard(client)
+
+    def serve_client(self, client: socket.socket, addr: Address) -> None:
+        with client:
+            if self.config.framed:
+                with client.makefile("rb") as stream, contextlib.suppress(
+                    FrameError, OSError
+                ):
+                    session = Session(self.config, addr)
+                    while (request := read_frame(stream)) is not None:
+                        response = session.respond(request)
+                        client.sendall(encode_frame(response))
+                        self.count_served()
+            else:
+                request = client.recv(1024)
+                for chunk in Session(self.config, addr).stream(request):
+                    client.sendall(chunk)
+                self.count_served()
+
+    def count_served(self) -> None:
+        with self.lock:
+            self.served += 1
+
+
+class Connection:
+    """What :class:`SelectorServer` knows about one client."""
+
+    def __init__(
+        self, client: socket.socket, addr: Address, config: ServerConfig
+    ) -> None:
+        self.client = client
+        self.addr = addr
+        self.session = Session(config, addr)
+        self.decoder = FrameDecoder()
+        # Received, and waiting their turn on the executor.
+        self.requests: collections.deque[bytes] = collections.deque()
+        # One of this connection's requests is on the executor.
+        self.busy = False
+        self.outgoing = bytearray()
+        self.closing = False
+        # After an error nothing more is sent, and the client is closed.
+        self.broken = False
+
+
+class SelectorServer(DiceServer):
+    """A single thread multiplexing every connection with ``selectors``.
+
+    Rolling and compressing run on a pool of ``workers`` threads, so a
+    huge request doesn't stall the other connections; each connection's
+    requests run one at a time, so responses go back in order.
+
+    Past ``max_connections`` the listening socket is unregistered, so new
+    clients wait in the listen backlog. A connection stops being read
+    while ``high_water`` bytes wait to be sent to it, or ``max_queued``
+    requests wait to run, so a client that never reads can't make the
+    server buffer without bound. An error closes only its own connection.
+    """
+
+    poll_interval = 0.05
+    max_queued = 64
+
+    def serve_forever(self) -> None:
+        self.selector = selectors.DefaultSelector()
+        self.connections: dict[socket.socket, Connection] = {}
+        self.finished: queue.SimpleQueue[
+            tuple[Connection, Future[bytes]]
+        ] = queue.SimpleQueue()
+        # A byte on this socket pair wakes select() when a response is ready.
+        self.wakeup, self.waker = socket.socketpair()
+        with self.listen() as server, self.selector, self.wakeup, self.waker, (
+            ThreadPoolExecutor(self.config.workers)
+        ) as self.executor:
+            server.setblocking(False)
+            self.wakeup.setblocking(False)
+            self.selector.register(self.wakeup, selectors.EVENT_READ)
+            self.ready.set()
+            while not self.stopping.is_set() or self.connections:
+                if self.stopping.is_set() and self.config.framed:
+                    for connection in list(self.connections.values()):
+                        # Stop reading; answer what's been received.
+                        connection.closing = True
+                        self.update(connection)
+                self.accepting(
+                    server,
+                    not self.stopping.is_set()
+                    and len(self.connections) < self.config.max_connections,
+                )
+                for key, events in self.selector.select(self.poll_interval):
+                    if key.fileobj is server:
+                        self.accept(server)
+                    elif key.fileobj is self.wakeup:
+                        self.responses_ready()
+                    else:
+                        self.ready_to(key.data, events)
+
+    def accepting(self, server: socket.socket, accept: bool) -> None:
+        registered = server in self.selector.get_map()
+        if accept and not registered:
+            self.selector.register(server, selectors.EVENT_READ)
+        elif registered and not accept:
+            self.selector.unregister(server)
+
+    def accept(self, server: socket.socket) -> None:
+        try:
+            client, addr = server.accept()
+        except BlockingIOError:
+            return
+        client.setblocking(False)
+        connection = Connection(client, addr, self.config)
+        self.connections[client] = connection
+        self.selector.register(client, selectors.EVENT_READ, connection)
+
+    def ready_to(self, connection: Connection, events: int) -> None:
+        try:
+            if events & selectors.EVENT_READ:
+                self.read(connection)
+            if events & selectors.EVENT_WRITE and connection.outgoing:
+                sent = connection.client.send(connection.outgoing)
+                del connection.outgoing[:sent]
+        except Exception:
+            self.fail(connection)
+        self.update(connection)
+
+    def read(self, connection: Connection) -> None:
+        data = connection.client.recv(65536)
+        if not data:
+            connection.closing = True
+        elif self.config.framed:
+            connection.requests.extend(connection.decoder.feed(data))
+        else:
+            connection.requests.append(data)
+            connection.closing = True
+        self.next_request(connection)
+
+    def next_request(self, connection: Connection) -> None:
+        if connection.busy or not connection.requests:
+            return
+        connection.busy = True
+        request = connection.requests.popleft()
+        future = self.executor.submit(connection.session.respond, request)
+        future.add_done_callback(lambda done: self.wake(connection, done))
+
+    def wake(self, connection: Connection, future: Future[bytes]) -> None:
+        """Runs on a worker thread: hand the response to the selector's."""
+        self.finished.put((connection, future))
+        with contextlib.suppress(OSError):
+            self.waker.send(b"\0")
+
+    def responses_ready(self) -> None:
+        with contextlib.suppress(BlockingIOError):
+            self.wakeup.recv(4096)
+        while True:
+            try:
+                connection, future = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            connection.busy = False
+            if not connection.broken:
+                try:
+                    response = future.result()
+                    if self.config.framed:
+                        response = encode_frame(response)
+                except Exception:
+                    self.fail(connection)
+                else:
+                    connection.outgoing += response
+                    self.served += 1
+                    self.next_request(connection)
+            self.update(connection)
+
+    def fail(self, connection: Connection) -> None:
+        connection.broken = connection.closing = True
+        connection.requests.clear()
+        connection.outgoing.clear()
+
+    def backlogged(self, connection: Connection) -> bool:
+        return (
+            len(connection.outgoing) >= self.config.high_water
+            or len(connection.requests) >= self.max_queued
+        )
+
+    def update(self, connection: Connection) -> None:
+        """Wait for whatever this connection needs next, or close it."""
+        events = 0
+        if not connection.closing and not self.backlogged(connection):
+            events |= selectors.EVENT_READ
+        if connection.outgoing:
+            events |= selectors.EVENT_WRITE
+        registered = connection.client in self.selector.get_map()
+        if events and registered:
+            self.selector.modify(connection.client, events, connection)
+        elif events:
+            self.selector.register(connection.client, events, connection)
+        elif registered:
+            self.selector.unregister(connection.client)
+        if events or connection.busy or connection.requests:
+            return
+        connection.client.close()
+        del self.connections[connection.client]
+
+
+class AsyncioServer(DiceServer):
+    """Each connection is an asyncio task; ``max_connections`` of them
+    are handled at a time, and the rest wait for a slot.
+
+    Rolling and compressing run on a pool of ``workers`` threads, so a
+    huge request doesn't stall the event loop. An error closes only its
+    own connection.
+    """
+
+    def serve_forever(self) -> None:
+        with ThreadPoolExecutor(self.config.workers) as self.executor:
+            asyncio.run(self.serve())
+
+    async def serve(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.stop = asyncio.Event()
+        slots = asyncio.Semaphore(self.config.max_connections)
+        tasks: set[asyncio.Task[None]] = set()
+        readers: set[asyncio.StreamReader] = set()
+
+        async def handle(
+            reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+        ) -> None:
+            task = asyncio.current_task()
+            assert task is not None
+            tasks.add(task)
+            readers.add(reader)
+            addr = writer.get_extra_info("peername")[:2]
+            try:
+                async with slots:
+                    # Whatever goes wrong, only this connection is lost.
+                    with contextlib.suppress(Exception):
+                        if self.config.framed:
+                            await self.serve_frames(reader, writer, addr)
+                        else:
+                            await self.serve_once(reader, writer, addr)
+                    writer.close()
+                    with contextlib.suppress(ConnectionError):
+                        await writer.wait_closed()
+            finally:
+                readers.discard(reader)
+                tasks.discard(task)
+
+        server = await asyncio.start_server(
+            handle, self.config.host, self.config.port, backlog=self.config.backlog
+        )
+        self.address = server.sockets[0].getsockname()[:2]
+        self.ready.set()
+        if self.stopping.is_set():
+            self.stop.set()
+        async with server:
+            await self.stop.wait()
+            server.close()
+            for reader in readers if self.config.framed else ():
+                # Requests already received are answered, then the loop ends.
+                reader.feed_eof()
+            await server.wait_closed()
+            if tasks:
+                await asyncio.wait(tasks)
+
+    async def serve_once(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, addr: Address
+    ) -> None:
+        request = await reader.read(1024)
+        chunks = Session(self.config, addr).stream(request)
+        while (
+            chunk := await self.loop.run_in_executor(self.executor, next, chunks, None)
+        ) is not None:
+            writer.write(chunk)
+            await writer.drain()
+        self.served += 1
+
+    async def serve_frames(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, addr: Address
+    ) -> None:
+        session = Session(self.config, addr)
+        while (request := await read_frame_async(reader)) is not None:
+            response = await self.loop.run_in_executor(
+                self.executor, session.respond, request
+            )
+            writer.write(encode_frame(response))
+            self.served += 1
+            await writer.drain()
+
+    def shutdown(self) -> None:
+        super().shutdown()
+        if self.ready.is_set():
+            self.loop.call_soon_threadsafe(self.stop.set)
+
+
+modes: dict[str, type[DiceServer]] = {
+    "threads": ThreadPoolServer,
+    "selectors": SelectorServer,
+    "asyncio": AsyncioServer,
+}
+
+
+@dataclass
+class LoadReport:
+    requests: int
+    errors: int
+    seconds: float
+    latencies: list[float]
+
+    @property
+    def requests_per_s(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    @property
+    def p50(self) -> float:
+        # NaN when every request failed, and there's nothing to report.
+        return statistics.median(self.latencies) if self.latencies else math.nan
+
+    @property
+    def p99(self) -> float:
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else math.nan
+        return statistics.quantiles(self.latencies, n=100)[98]
+
+    def __str__(self) -> str:
+        return (
+            f"{self.requests} requests, {self.errors} errors, "
+            f"{self.requests_per_s:,.0f} req/s, "
+            f"p50 {self.p50 * 1000:.2f} ms, p99 {self.p99 * 1000:.2f} ms"
+        )
+
+
+def request_once(address: Address, request: bytes) -> bytes:
+    with socket.create_connection(address) as client:
+        client.sendall(request)
+        return recv_all(client)
+
+
+def load_test(
+    address: Address,
+    clients: int = 16,
+    requests: int = 2_000,
+    request: bytes = b"Dice 6 4d6d1",
+) -> LoadReport:
+    """Send ``requests`` requests from ``clients`` concurrent client threads."""
+
+    def timed(_: int) -> Optional[float]:
+        start = time.perf_counter()
+        try:
+            request_once(address, request)
+        except OSError:
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        results = list(executor.map(timed, range(requests)))
+    seconds = time.perf_counter() - start
+    latencies = [r for r in results if r is not None]
+    return LoadReport(len(latencies), len(results) - len(latencies), seconds, latencies)
+
+
+def start(mode: str, config: ServerConfig) -> tuple[DiceServer, threading.Thread]:
+    """Serve in a background thread; returns once the server is listening."""
+    server = modes[mode](config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.ready.wait()
+    return server, thread
+
+
+def benchmark(requests: int = 2_000, clients: int = 16) -> None:
+    for mode in modes:
+        server, thread = start(mode, ServerConfig(port=0))
+        report = load_test(server.address, clients, requests)
+        server.shutdown()
+        thread.join()
+        print(f"{mode:10s} {report}")
+
+
+def framing_benchmark(requests: int = 2_000, mode: str = "threads") -> None:
+    """Compare a connection per request with one framed connection."""
+    request = b"Dice 6 4d6d1"
+    plain, plain_thread = start(mode, ServerConfig(port=0))
+    framed, framed_thread = start(mode, ServerConfig(port=0, framed=True))
+
+    def connect_per_request() -> None:
+        for _ in range(requests):
+            request_once(plain.address, request)
+
+    def persistent(window: int) -> Callable[[], None]:
+        def run() -> None:
+            with socket.create_connection(framed.address) as client:
+                for _ in pipeline(client, [request] * requests, window):
+                    pass
+
+        return run
+
+    for name, run in [
+        ("connect per request", connect_per_request),
+        ("persistent, 1 in flight", persistent(1)),
+        ("persistent, 64 in flight", persistent(64)),
+    ]:
+        start_time = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start_time
+        print(f"{name:26s} {requests / elapsed:10,.0f} req/s")
+    for server, thread in [(plain, plain_thread), (framed, framed_thread)]:
+        server.shutdown()
+        thread.join()
+
+
+def main(mode: str = "threads") -> None:
+    server = modes[mode](ServerConfig(log=True))
+    print(f"localhost {mode} server listening on port {server.config.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+test_modes = """
+>>> import gzip
+>>> for mode in modes:
+...     server, thread = start(mode, ServerConfig(port=0, max_connections=4))
+...     first = gzip.decompress(request_once(server.address, b"Dice 3 d6"))
+...     error = request_once(server.address, b"Dice 3 6")
+...     report = load_test(server.address, clients=8, requests=100)
+...     server.shutdown()
+...     thread.join(timeout=5)
+...     print(mode, first[:12], error, report.errors, server.served, thread.is_alive())
+threads b'Dice 3 d6 = ' b'ValueError("Error in \\'6\\'")' 0 102 False
+selectors b'Dice 3 d6 = ' b'ValueError("Error in \\'6\\'")' 0 102 False
+asyncio b'Dice 3 d6 = ' b'ValueError("Error in \\'6\\'")' 0 102 False
+
+"""
+
+test_framed = """
+An idle persistent connection doesn't hold up a shutdown.
+
+>>> import gzip
+>>> requests = [f"Dice {n} 3d6".encode() for n in range(1, 201)]
+>>> for mode in modes:
+...     server, thread = start(mode, ServerConfig(port=0, framed=True))
+...     with socket.create_connection(server.address) as client:
+...         responses = list(pipeline(client, requests, window=16))
+...     counts = [gzip.decompress(r).count(b",") + 1 for r in responses]
+...     idle = socket.create_connection(server.address)
+...     _ = list(pipeline(idle, [b"Dice 1 d6"]))
+...     server.shutdown()
+...     thread.join(timeout=5)
+...     print(mode, counts == list(range(1, 201)), server.served, thread.is_alive())
+...     idle.close()
+threads True 201 False
+selectors True 201 False
+asyncio True 201 False
+
+"""
+
+
+test_isolation = """
+An unexpected error (here, a MemoryError from asking for 64 trillion
+dice), a huge request, or a client that never reads costs only its own
+connection.
+
+>>> import time
+>>> for mode in modes:
+...     server, thread = start(mode, ServerConfig(port=0, framed=True, high_water=4096))
+...     with socket.create_connection(server.address) as client:
+...         try:
+...             list(pipeline(client, [b"Dice 64 1000000000000d6"]))
+...         except ConnectionError as ex:
+...             error = ex
+...     huge = socket.create_connection(server.address)
+...     huge.sendall(encode_frame(b"Dice 300000 4d6k3"))
+...     hog = socket.create_connection(server.address)
+...     hog.setblocking(False)
+...     with contextlib.suppress(BlockingIOError):
+...         for _ in range(20_000):
+...             _ = hog.send(encode_frame(b"Dice 100 d6"))
+...     start_time = time.perf_counter()
+...     with socket.create_connection(server.address) as client:
+...         (response,) = pipeline(client, [b"Dice 1 d6"])
+...     prompt = time.perf_counter() - start_time < 0.5
+...     huge.close()
+...     hog.close()
+...     server.shutdown()
+...     thread.join(timeout=5)
+...     print(mode, error, prompt, thread.is_alive())
+threads Server closed the connection True False
+selectors Server closed the connection True False
+asyncio Server closed the connection True False
+
+A selector connection isn't read while its output or its queue is full.
+
+>>> server = SelectorServer(ServerConfig(high_water=4096))
+>>> connection = Connection(socket.socket(), ("localhost", 0), server.config)
+>>> before = server.backlogged(connection)
+>>> connection.outgoing += bytes(4096)
+>>> before, server.backlogged(connection)
+(False, True)
+>>> connection.client.close()
+
+"""
+
+test_load_report = """
+>>> print(LoadReport(0, 5, 1.0, []))
+0 requests, 5 errors, 0 req/s, p50 nan ms, p99 nan ms
+>>> print(LoadReport(1, 0, 0.5, [0.002]))
+1 requests, 0 errors, 2 req/s, p50 2.00 ms, p99 2.00 ms
+
+"""
+
+test_negotiation = """
+>>> import gzip
+>>> from dice_compression import CODECS, accept_frame, decode_tagged
+>>> server, thread = start("selectors", ServerConfig(port=0, framed=True))
+>>> requests = [b"Dice 1 d6", accept_frame(["brotli", "deflate"])]
+>>> requests += [b"Dice 1 d6", b"Dice 100 3d6", b"Dice 1 six"]
+>>> with socket.create_connection(server.address) as client:
+...     before, reply, small, large, error = pipeline(client, requests)
+>>> gzip.decompress(before)[:12], reply
+(b'Dice 1 d6 = ', b'Content-Encoding: deflate')
+>>> small[:13]
+b'\\x00Dice 1 d6 = '
+>>> large[:1], decode_tagged(large, CODECS["deflate"]).count(b",") + 1
+(b'\\x01', 100)
+>>> print(decode_tagged(error, CODECS["deflate"]).decode())
+ValueError("Error in 'six'")
+>>> server.shutdown()
+>>> thread.join()
+
+A big response is rolled a slice at a time, and compressed as it's sent.
+Logging doesn't stop it streaming.
+
+>>> session = Session(ServerConfig(zip=False), ("localhost", 0))
+>>> [len(piece) for piece in session.stream(b"Dice 40000 d6")]
+[49167, 49152, 21696, 1]
+>>> import random
+>>> random.seed(42)
+>>> session = Session(ServerConfig(zip=False, log=True), ("localhost", 0))
+>>> session.respond(b"Dice 3 d6")
+Receiving b'Dice 3 d6' from ('localhost', 0)
+Sending b'Dice 3 d6 = [6, 1, 1' to ('localhost', 0)
+Sending b']' to ('localhost', 0)
+b'Dice 3 d6 = [6, 1, 1]'
+
+>>> server, thread = start("threads", ServerConfig(port=0))
+>>> big = gzip.decompress(request_once(server.address, b"Dice 50000 d6"))
+>>> big.count(b",") + 1
+50000
+>>> server.shutdown()
+>>> thread.join()
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
+
+if __name__ == "__main__":
+    import sys
+
+    main(*sys.argv[1:])
@@ -0,0 +1,245 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import collections
+import itertools
+import math
+import os
+import random
+import statistics
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Protocol
+from dice import Dice
+from dice_rng import PythonRandom, RandomSource
+from inventory import ZonkHandHistory, three_pair
+
+
+class Tally:
+    """What a batch of trials found: a histogram of outcomes, and hits."""
+
+    def __init__(self) -> None:
+        self.trials = 0
+        self.hits = 0
+        self.histogram: collections.Counter[int] = collections.Counter()
+
+    def __iadd__(self, other: "Tally") -> "Tally":
+        self.trials += other.trials
+        self.hits += other.hits
+        self.histogram.update(other.histogram)
+        return self
+
+    @property
+    def rate(self) -> float:
+        return self.hits / self.trials if self.trials else 0.0
+
+    @property
+    def mean(self) -> float:
+        total = sum(self.histogram.values())
+        return sum(x * n for x, n in self.histogram.items()) / total if total else 0.0
+
+    def half_width(self, confidence: float = 0.95) -> float:
+        """Half the width of the Wilson score interval for ``rate``.
+
+        Unlike the normal approximation, it doesn't shrink to nothing when
+        there are no hits, or nothing but hits.
+        """
+        if not self.trials:
+            return math.inf
+        n = self.trials
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        spread = self.rate * (1 - self.rate) / n + z * z / (4 * n * n)
+        return z * math.sqrt(spread) / (1 + z * z / n)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(trials={self.trials}, hits={self.hits})"
+
+
+class Scenario(Protocol):
+    """Runs ``trials`` trials with numbers from ``rng``.
+
+    Scenarios are sent to worker processes, so they have to pickle.
+    """
+
+    def __call__(self, rng: RandomSource, trials: int) -> Tally:
+        ...
+
+
+class DiceTotals:
+    """Roll ``dice_text``; a hit is a total of at least ``target``."""
+
+    def __init__(self, dice_text: str, target: Optional[int] = None) -> None:
+        self.dice_text = dice_text
+        self.target = target
+
+    def __call__(self, rng: RandomSource, trials: int) -> Tally:
+        totals = Dice.from_text(self.dice_text).roll_many(trials, rng)
+        tally = Tally()
+        tally.trials = trials
+        tally.histogram.update(totals)
+        if self.target is not None:
+            tally.hits = sum(1 for total in totals if total >= self.target)
+        return tally
+
+
+class ThreePairZonk:
+    """Roll Zonk hands with :class:`ZonkHandHistory`; a hit is a three-pair hand.
+
+    The histogram counts hands by how many different faces they show.
+    """
+
+    def __init__(self, dice_text: str = "6d6") -> None:
+        self.dice_text = dice_text
+
+    def __call__(self, rng: RandomSource, trials: int) -> Tally:
+        player = ZonkHandHistory("Simulation", Dice.from_text(self.dice_text), rng)
+        tally = Tally()
+        tally.trials = trials
+        for _ in range(trials):
+            hand = player.start()
+            tally.histogram[len(set(hand))] += 1
+            tally.hits += three_pair(hand)
+        return tally
+
+
+def run_shard(scenario: Scenario, seed: int, shard: int, trials: int) -> Tally:
+    """Run one shard with the stream seeded by ``f"{seed}/{shard}"``.
+
+    The stream depends only on the seed and the shard number, never on
+    which worker runs it, so a simulation is reproducible.
+    """
+    return scenario(PythonRandom(random.Random(f"{seed}/{shard}")), trials)
+
+
+class Simulation:
+    """Shards the trials of a :class:`Scenario` across a process pool.
+
+    Two shards per worker are kept queued, so no worker waits for the
+    others. Tallies are added up in shard order, and with a ``half_width``
+    the run stops once the confidence interval for the hit rate is that
+    narrow, and at least ``min_hits`` hits and misses have been seen.
+    Which shards count depends only on their results, never on timing.
+    """
+
+    def __init__(
+        self,
+        scenario: Scenario,
+        seed: int = 42,
+        workers: Optional[int] = None,
+        shard_size: int = 50_000,
+    ) -> None:
+        self.scenario = scenario
+        self.seed = seed
+        self.workers = workers
+        self.shard_size = shard_size
+
+    def run(
+        self,
+        max_trials: int,
+        half_width: Optional[float] = None,
+        confidence: float = 0.95,
+        min_hits: int = 10,
+    ) -> Tally:
+        tally = Tally()
+        workers = self.workers or os.cpu_count() or 1
+        shards = enumerate(
+            min(self.shard_size, max_trials - start)
+            for start in range(0, max_trials, self.shard_size)
+        )
+        pending: collections.deque[Future[Tally]] = collections.deque()
+        with ProcessPoolExecutor(workers) as executor:
+            while True:
+                for shard, size in itertools.islice(shards, 2 * workers - len(pending)):
+                    pending.append(
+                        executor.submit(
+                            run_shard, self.scenario, self.seed, shard, size
+                        )
+                    )
+                if not pending:
+                    break
+                tally += pending.popleft().result()
+                if half_width is not None and self.precise(
+                    tally, half_width, confidence, min_hits
+                ):
+                    for future in pending:
+                        future.cancel()
+                    break
+        return tally
+
+    @staticmethod
+    def precise(
+        tally: Tally, half_width: float, confidence: float, min_hits: int
+    ) -> bool:
+        return (
+            min(tally.hits, tally.trials - tally.hits) >= min_hits
+            and tally.half_width(confidence) <= half_width
+        )
+
+
+def main() -> None:
+    scenarios: list[Scenario] = [DiceTotals("4d6d1", target=16), ThreePairZonk()]
+    for scenario in scenarios:
+        start = time.perf_counter()
+        tally = Simulation(scenario).run(1_000_000)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{scenario.__class__.__name__}: {tally.trials} trials in {elapsed:.1f}s, "
+            f"rate {tally.rate:.5f} ± {tally.half_width():.5f}, mean {tally.mean:.3f}"
+        )
+
+
+test_simulation = """
+>>> from dice_stats import Distribution
+>>> exact = float(1 - Distribution.from_text("2d6").cdf(9))
+>>> exact
+0.16666666666666666
+
+>>> simulation = Simulation(DiceTotals("2d6", target=10), workers=2, shard_size=5_000)
+>>> tally = simulation.run(40_000)
+>>> tally.trials, sorted(tally.histogram) == list(range(2, 13))
+(40000, True)
+>>> abs(tally.rate - exact) < 3 * tally.half_width()
+True
+>>> simulation.run(40_000).hits == tally.hits
+True
+
+Stopping early, once the 95% interval is within 0.01 of the rate:
+
+>>> early = simulation.run(1_000_000, half_width=0.01)
+>>> early.trials
+10000
+>>> early.half_width() <= 0.01
+True
+
+A rare hit isn't mistaken for none: 24 on 4d6 is 1 roll in 1296.
+
+>>> rare = Simulation(DiceTotals("4d6", target=24), workers=2, shard_size=1_000)
+>>> tally = rare.run(100_000, half_width=0.0005)
+>>> tally.hits >= 10, tally.trials < 100_000, abs(tally.rate - 1 / 1296) < 0.0005
+(True, True, True)
+>>> never = DiceTotals("4d6", target=25)(PythonRandom(random.Random(1)), 200)
+>>> never.rate, round(never.half_width(), 4)
+(0.0, 0.0094)
+
+Without a target nothing counts as a hit, so the run can't stop early.
+
+>>> simulation.scenario = DiceTotals("2d6")
+>>> simulation.run(40_000, half_width=0.01).trials
+40000
+
+>>> zonk = Simulation(ThreePairZonk(), workers=2, shard_size=2_000).run(4_000)
+>>> zonk.hits == sum(run_shard(ThreePairZonk(), 42, n, 2_000).hits for n in range(2))
+True
+>>> sum(zonk.histogram.values())
+4000
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
+
+if __name__ == "__main__":
+    main()
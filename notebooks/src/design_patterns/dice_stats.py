@@ -0,0 +1,210 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import functools
+import math
+from fractions import Fraction
+from typing import NamedTuple
+from dice import Dice, Drop, Keep, Minus, Plus, Roll
+
+
+class Expression(NamedTuple):
+    """A :class:`Dice` reduced to what decides its distribution.
+
+    The sum is of the sorted dice ``lo`` up to ``hi``, plus ``modifier``.
+    ``Dice(4, 6, Keep(3))`` and ``Dice(4, 6, Keep(3), Plus(2), Minus(2))``
+    normalize the same way.
+    """
+
+    n: int
+    d: int
+    lo: int
+    hi: int
+    modifier: int
+
+    @classmethod
+    def from_dice(cls, dice: Dice) -> "Expression":
+        n = d = lo = hi = modifier = 0
+        for a in dice.adjustments:
+            # Each case mirrors the matching apply() on a sorted list.
+            if isinstance(a, Roll):
+                if a.d < 1:
+                    # Rolling one raises too: randint() has an empty range.
+                    raise ValueError(f"Can't analyze d{a.d}: a die needs a side")
+                n, d, lo, hi, modifier = a.n, a.d, 0, a.n, 0
+            elif isinstance(a, Drop):
+                lo = min(lo + a.amount, hi)
+            elif isinstance(a, Keep):
+                hi = min(lo + a.amount, hi)
+            elif isinstance(a, Plus):
+                modifier += a.amount
+            elif isinstance(a, Minus):
+                modifier -= a.amount
+            else:
+                raise TypeError(f"Can't analyze {a!r}")
+        return cls(n, d, lo, hi, modifier)
+
+
+def _convolve(left: dict[int, int], right: dict[int, int]) -> dict[int, int]:
+    result: dict[int, int] = {}
+    for a, ways_a in left.items():
+        for b, ways_b in right.items():
+            result[a + b] = result.get(a + b, 0) + ways_a * ways_b
+    return result
+
+
+def _sum_ways(n: int, d: int) -> dict[int, int]:
+    """Ways to roll each total on ``n`` dice, by repeated convolution."""
+    ways = {0: 1}
+    die = {face: 1 for face in range(1, d + 1)}
+    while n:
+        if n & 1:
+            ways = _convolve(ways, die)
+        die = _convolve(die, die)
+        n >>= 1
+    return ways
+
+
+def _order_statistic_ways(n: int, d: int, lo: int, hi: int) -> dict[int, int]:
+    """Ways to roll each total of the sorted dice ``lo`` up to ``hi``.
+
+    Faces are handed out lowest first. With ``placed`` dice already showing
+    smaller faces, the ``k`` showing this face take the next ``k`` places in
+    sorted order, and ``comb(n - placed, k)`` says which dice they are.
+    """
+    # ways[placed][total]
+    ways: list[dict[int, int]] = [{} for _ in range(n + 1)]
+    ways[0][0] = 1
+    for face in range(1, d + 1):
+        after: list[dict[int, int]] = [{} for _ in range(n + 1)]
+        for placed, totals in enumerate(ways):
+            if face == d:
+                # Every remaining die shows the highest face.
+                counts = range(n - placed, n - placed + 1)
+            else:
+                counts = range(n - placed + 1)
+            for k in counts:
+                kept = max(0, min(placed + k, hi) - max(placed, lo))
+                choose = math.comb(n - placed, k)
+                target = after[placed + k]
+                for total, w in totals.items():
+                    total_k = total + face * kept
+                    target[total_k] = target.get(total_k, 0) + w * choose
+        ways = after
+    return ways[n]
+
+
+@functools.lru_cache(maxsize=256)
+def _ways(n: int, d: int, lo: int, hi: int) -> tuple[tuple[int, int], ...]:
+    if lo == 0 and hi == n:
+        ways = _sum_ways(n, d)
+    else:
+        ways = _order_statistic_ways(n, d, lo, hi)
+    return tuple(sorted(ways.items()))
+
+
+class Distribution:
+    """The exact probability of every total a :class:`Dice` can roll."""
+
+    def __init__(self, expression: Expression) -> None:
+        self.expression = expression
+        n, d, lo, hi, modifier = expression
+        outcomes = d**n
+        self.pmf: dict[int, Fraction] = {
+            total + modifier: Fraction(ways, outcomes)
+            for total, ways in _ways(n, d, lo, hi)
+        }
+
+    @classmethod
+    def from_dice(cls, dice: Dice) -> "Distribution":
+        return cls(Expression.from_dice(dice))
+
+    @classmethod
+    def from_text(cls, dice_text: str) -> "Distribution":
+        return cls.from_dice(Dice.from_text(dice_text))
+
+    @property
+    def mean(self) -> Fraction:
+        return sum((p * x for x, p in self.pmf.items()), Fraction(0))
+
+    @property
+    def variance(self) -> Fraction:
+        mean = self.mean
+        return sum((p * (x - mean) ** 2 for x, p in self.pmf.items()), Fraction(0))
+
+    def cdf(self, x: int) -> Fraction:
+        return sum((p for total, p in self.pmf.items() if total <= x), Fraction(0))
+
+    def percentile(self, q: float) -> int:
+        """The smallest total that at least ``q`` percent of rolls don't exceed."""
+        target = Fraction(q) / 100
+        cumulative = Fraction(0)
+        for total, p in self.pmf.items():
+            cumulative += p
+            if cumulative >= target:
+                return total
+        return max(self.pmf)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.expression})"
+
+
+test_distribution = """
+>>> dist = Distribution.from_text("2d6+1")
+>>> dist.pmf[8], dist.pmf[3], min(dist.pmf), max(dist.pmf)
+(Fraction(1, 6), Fraction(1, 36), 3, 13)
+>>> dist.mean, dist.variance
+(Fraction(8, 1), Fraction(35, 6))
+>>> dist.percentile(50), dist.percentile(100)
+(8, 13)
+
+``Roll`` sorts from lowest to highest, so ``k3`` keeps the three lowest
+and ``d1`` drops the lowest. Brute force agrees with the order-statistic DP.
+
+>>> import itertools
+>>> from collections import Counter
+>>> def brute_force(n, d, lo, hi, modifier=0):
+...     totals = Counter(
+...         sum(sorted(faces)[lo:hi]) + modifier
+...         for faces in itertools.product(range(1, d + 1), repeat=n)
+...     )
+...     return {total: Fraction(ways, d**n) for total, ways in sorted(totals.items())}
+>>> Distribution.from_text("4d6k3").pmf == brute_force(4, 6, 0, 3)
+True
+>>> Distribution.from_text("4d6d1").pmf == brute_force(4, 6, 1, 4)
+True
+>>> Distribution.from_dice(Dice(5, 4, Drop(1), Keep(2), Minus(3))).pmf == brute_force(
+...     5, 4, 1, 3, -3
+... )
+True
+>>> Distribution.from_text("3d6d5").pmf
+{0: Fraction(1, 1)}
+>>> float(Distribution.from_text("4d6d1").mean)
+12.244598765432098
+
+Expressions that normalize the same share one cached calculation.
+
+>>> _ways.cache_clear()
+>>> Expression.from_dice(Dice(4, 6, Keep(3), Plus(2), Minus(2)))
+Expression(n=4, d=6, lo=0, hi=3, modifier=0)
+>>> Distribution.from_text("4d6k3").pmf == Distribution.from_dice(
+...     Dice(4, 6, Keep(3), Plus(2), Minus(2))
+... ).pmf
+True
+>>> _ways.cache_info().hits
+1
+
+A die with no sides can't be rolled, so it can't be analyzed either.
+
+>>> Distribution.from_text("3d0")
+Traceback (most recent call last):
+...
+ValueError: Can't analyze d0: a die needs a side
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
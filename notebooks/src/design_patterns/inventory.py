@@ -8,6 +8,7 @@ import random
 import json
 import time
 from dice import Dice
+from dice_rng import GLOBAL_RANDOM, RandomSource
 from typing import List, Protocol
 
 
@@ -35,23 +36,26 @@ Hand = List[int]
 
 
 class ZonkHandHistory(Observable):
-    def __init__(self, player: str, dice_set: Dice) -> None:
+    def __init__(
+        self, player: str, dice_set: Dice, rng: RandomSource = GLOBAL_RANDOM
+    ) -> None:
         super().__init__()
         self.player = player
         self.dice_set = dice_set
+        self.rng = rng
         self.rolls: list[Hand]
 
     def start(self) -> Hand:
-        self.dice_set.roll()
-        self.rolls = [self.dice_set.dice]
+        hand = self.dice_set.roll_result(self.rng).dice
+        self.rolls = [hand]
         self._notify_observers()  # State change
-        return self.dice_set.dice
+        return hand
 
     def roll(self) -> Hand:
-        self.dice_set.roll()
-        self.rolls.append(self.dice_set.dice)
+        hand = self.dice_set.roll_result(self.rng).dice
+        self.rolls.append(hand)
         self._notify_observers()  # State change
-        return self.dice_set.dice
+        return hand
 
 
 class SaveZonkHand(Observer):
@@ -70,6 +74,13 @@ class SaveZonkHand(Observer):
         print(f"SaveZonkHand {message}")
 
 
+def three_pair(hand: Hand) -> bool:
+    distinct_values = set(hand)
+    return len(distinct_values) == 3 and all(
+        hand.count(v) == 2 for v in distinct_values
+    )
+
+
 class ThreePairZonkHand:
     """Observer of ZonkHandHistory"""
 
@@ -78,11 +89,7 @@ class ThreePairZonkHand:
         self.zonked = False
 
     def __call__(self) -> None:
-        last_roll = self.hand.rolls[-1]
-        distinct_values = set(last_roll)
-        self.zonked = len(distinct_values) == 3 and all(
-            last_roll.count(v) == 2 for v in distinct_values
-        )
+        self.zonked = three_pair(self.hand.rolls[-1])
         if self.zonked:
             print("3 Pair Zonk!")
 
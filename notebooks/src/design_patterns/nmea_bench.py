@@ -0,0 +1,282 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import functools
+import json
+import operator
+import random
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, cast, Iterable, Optional, Union
+import nmea_states
+import nmea_states_2
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore [assignment]
+
+
+BODIES = {
+    b"GGA": b"GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000",
+    b"GLL": b"GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A",
+    b"RMC": b"GPRMC,161229.487,A,3723.2475,N,12158.3416,W,0.13,309.62,120598,,",
+    b"VTG": b"GPVTG,309.62,T,,M,0.13,N,0.2,K",
+    b"GSA": b"GPGSA,A,3,04,05,,09,12,,,24,,,,,2.5,1.3,2.1",
+}
+
+# Bytes that can't start a sentence or end a checksum: harmless line noise.
+NOISE = b"ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789,. "
+
+
+def sentence(body: bytes, corrupt: bool = False) -> bytes:
+    checksum = functools.reduce(operator.xor, body, 0)
+    if corrupt:
+        # Still two hex digits, so every engine sees a well-formed mismatch.
+        checksum ^= 0x01
+    return b"$%s*%02X\r\n" % (body, checksum)
+
+
+@dataclass
+class CaptureSpec:
+    """How to build a synthetic capture.
+
+    ``mix`` weights the sentence types in ``BODIES``. Before each sentence,
+    ``noise_rate`` is the chance of some line noise or a sentence cut short
+    by the next ``$``; ``corrupt_rate`` is the chance its checksum is wrong.
+    """
+
+    size: int = 1_000_000
+    mix: dict[str, float] = field(
+        default_factory=lambda: {"GGA": 4, "RMC": 3, "GLL": 1, "VTG": 1, "GSA": 1}
+    )
+    noise_rate: float = 0.01
+    corrupt_rate: float = 0.01
+    seed: int = 42
+
+
+def synthetic_capture(spec: CaptureSpec) -> bytes:
+    """Generate a capture of at least ``spec.size`` bytes."""
+    rng = random.Random(spec.seed)
+    types = [name.encode() for name in spec.mix]
+    weights = list(spec.mix.values())
+    capture = bytearray()
+    while len(capture) < spec.size:
+        body = BODIES[rng.choices(types, weights)[0]]
+        if rng.random() < spec.noise_rate:
+            if rng.random() < 0.5:
+                capture += bytes(rng.choices(NOISE, k=rng.randrange(1, 40)))
+            else:
+                capture += b"$" + body[: rng.randrange(len(body))]
+        capture += sentence(body, corrupt=rng.random() < spec.corrupt_rate)
+    return bytes(capture)
+
+
+def chunks(capture: bytes, size: int = 64 * 1024) -> list[memoryview]:
+    view = memoryview(capture)
+    return [view[i : i + size] for i in range(0, len(view), size)]
+
+
+def source(capture: bytes) -> Iterable[bytes]:
+    # The byte-at-a-time readers iterate a capture as it is.
+    return cast(Iterable[bytes], capture)
+
+
+ENGINES: dict[str, Callable[[bytes], Iterable[Any]]] = {
+    "nmea_states.Reader.read": lambda c: nmea_states.Reader().read(source(c)),
+    "nmea_states.Reader.read_chunks": lambda c: nmea_states.Reader().read_chunks(
+        chunks(c)
+    ),
+    "nmea_states.Reader.read_views": lambda c: nmea_states.Reader().read_views(
+        chunks(c)
+    ),
+    "nmea_states_2.Reader.read": lambda c: nmea_states_2.Reader().read(source(c)),
+    "nmea_states_2.TableReader.read": lambda c: nmea_states_2.TableReader().read(
+        source(c)
+    ),
+}
+
+
+@dataclass
+class BenchResult:
+    engine: str
+    bytes: int
+    sentences: int
+    seconds: float
+    peak_rss_kib: Optional[int]
+    transient_peak_kib: float
+    retained_blocks_per_sentence: float
+    retained_bytes_per_sentence: float
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes / self.seconds / 1e6 if self.seconds else 0.0
+
+    @property
+    def sentences_per_s(self) -> float:
+        return self.sentences / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self) | {
+            "mb_per_s": self.mb_per_s,
+            "sentences_per_s": self.sentences_per_s,
+        }
+
+
+def peak_rss_kib() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure(engine: str, capture: bytes) -> BenchResult:
+    """Time one engine, then measure its memory under ``tracemalloc``.
+
+    Tracing slows everything down, so the memory passes run separately.
+    The first throws each sentence away and records the peak traced
+    memory, which includes the temporaries parsing makes along the way.
+    CPython doesn't count allocations that have since been freed, so this
+    peak is the nearest measure of them. The second pass keeps every
+    sentence, the way a consumer collecting them would, and counts the
+    blocks still live at the end.
+    """
+    parse = ENGINES[engine]
+    start = time.perf_counter()
+    count = sum(1 for _ in parse(capture))
+    seconds = time.perf_counter() - start
+    rss = peak_rss_kib()
+
+    tracemalloc.start()
+    try:
+        for _ in parse(capture):
+            pass
+        transient = tracemalloc.get_traced_memory()[1]
+        tracemalloc.clear_traces()
+        kept = list(parse(capture))
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+    finally:
+        tracemalloc.stop()
+    stats = snapshot.statistics("filename")
+    per_sentence = max(len(kept), 1)
+    return BenchResult(
+        engine=engine,
+        bytes=len(capture),
+        sentences=count,
+        seconds=seconds,
+        peak_rss_kib=rss,
+        transient_peak_kib=transient / 1024,
+        retained_blocks_per_sentence=sum(s.count for s in stats) / per_sentence,
+        retained_bytes_per_sentence=sum(s.size for s in stats) / per_sentence,
+    )
+
+
+def _measure_spec(engine: str, spec: CaptureSpec) -> BenchResult:
+    return measure(engine, synthetic_capture(spec))
+
+
+def run_suite(
+    spec: CaptureSpec,
+    engines: Optional[Iterable[str]] = None,
+    isolate: bool = True,
+) -> list[BenchResult]:
+    """Measure each engine against the same capture.
+
+    Peak RSS is a high-water mark for the whole process, so with ``isolate``
+    each engine runs in a fresh worker process that rebuilds the capture
+    from ``spec``.
+    """
+    names = list(engines or ENGINES)
+    if not isolate:
+        capture = synthetic_capture(spec)
+        return [measure(name, capture) for name in names]
+    results = []
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results.append(executor.submit(_measure_spec, name, spec).result())
+    return results
+
+
+def save(
+    path: Union[str, Path], spec: CaptureSpec, results: list[BenchResult]
+) -> None:
+    """Write a run as JSON, so later versions have something to compare with."""
+    document = {
+        "python": sys.version,
+        "spec": asdict(spec),
+        "results": [result.as_dict() for result in results],
+    }
+    Path(path).write_text(json.dumps(document, indent=2))
+
+
+def main(output: str = "nmea_bench.json") -> None:
+    spec = CaptureSpec()
+    results = run_suite(spec)
+    for r in results:
+        print(
+            f"{r.engine:32s} {r.mb_per_s:7.2f} MB/s "
+            f"{r.sentences_per_s:10.0f} sentences/s "
+            f"{r.peak_rss_kib or 0:8d} KiB RSS "
+            f"{r.transient_peak_kib:8.1f} KiB transient "
+            f"{r.retained_blocks_per_sentence:6.2f} blocks kept/sentence"
+        )
+    save(output, spec, results)
+
+
+test_synthetic_capture = """
+>>> spec = CaptureSpec(size=20_000, noise_rate=0.2, corrupt_rate=0.1)
+>>> capture = synthetic_capture(spec)
+>>> capture == synthetic_capture(spec)
+True
+>>> len(capture) >= 20_000
+True
+>>> sentence(BODIES[b"GLL"])
+b'$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41\\r\\n'
+>>> sentence(BODIES[b"GLL"], corrupt=True)
+b'$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*40\\r\\n'
+
+The engines of each module find the same sentences, and none of the
+corrupt ones. (``nmea_states_2`` doesn't reset on a ``$`` inside a header,
+so a sentence cut short there can spoil the next one.)
+
+>>> counts = {name: sum(1 for _ in parse(capture)) for name, parse in ENGINES.items()}
+>>> sorted(set(
+...     (name.split(".")[0], count) for name, count in counts.items()
+... ))  # doctest: +ELLIPSIS
+[('nmea_states', ...), ('nmea_states_2', ...)]
+>>> counts["nmea_states.Reader.read"] < capture.count(b"$")
+True
+>>> clean = synthetic_capture(CaptureSpec(size=20_000, noise_rate=0, corrupt_rate=0))
+>>> sum(1 for _ in nmea_states.Reader().read_views(chunks(clean))) == clean.count(b"$")
+True
+
+>>> import tempfile
+>>> results = run_suite(spec, ["nmea_states.Reader.read_views"], isolate=False)
+>>> results[0].sentences == counts["nmea_states.Reader.read_views"]
+True
+>>> with tempfile.TemporaryDirectory() as tmp:
+...     save(Path(tmp) / "bench.json", spec, results)
+...     saved = json.loads((Path(tmp) / "bench.json").read_text())
+>>> sorted(saved["results"][0])  # doctest: +NORMALIZE_WHITESPACE
+['bytes', 'engine', 'mb_per_s', 'peak_rss_kib', 'retained_blocks_per_sentence',
+ 'retained_bytes_per_sentence', 'seconds', 'sentences', 'sentences_per_s',
+ 'transient_peak_kib']
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,107 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import functools
+import operator
+from typing import Any, Sequence
+from nmea_states import Buffer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore [assignment]
+
+
+def checksum_mask(
+    data: Buffer, offsets: Sequence[int], lengths: Sequence[int]
+) -> Sequence[bool]:
+    """Check the checksum of every sentence ``data[offset : offset + length]``.
+
+    Each sentence runs from its ``$`` through the two checksum digits, as
+    recorded by ``nmea_index``. With NumPy installed all the XORs happen in
+    one ``bitwise_xor.reduceat`` call and the result is a boolean array;
+    otherwise it's a list computed one sentence at a time.
+    """
+    if numpy is not None:
+        mask: Sequence[bool] = _checksum_mask_numpy(data, offsets, lengths)
+        return mask
+    return _checksum_mask_python(data, offsets, lengths)
+
+
+def _checksum_mask_python(
+    data: Buffer, offsets: Sequence[int], lengths: Sequence[int]
+) -> list[bool]:
+    view = memoryview(data)
+    mask = []
+    for offset, length in zip(offsets, lengths):
+        star = offset + length - 3
+        computed = functools.reduce(operator.xor, view[offset + 1 : star], 0)
+        checksum = bytes(view[star : star + 3])
+        try:
+            valid = checksum[:1] == b"*" and int(checksum[1:], 16) == computed
+        except ValueError:
+            valid = False
+        mask.append(valid)
+    return mask
+
+
+def _hex_digits() -> Any:
+    """Lookup table from byte to hex digit value, or -1 for other bytes."""
+    table = numpy.full(256, -1, dtype=numpy.int16)
+    for digits, first in ((b"0123456789", 0), (b"ABCDEF", 10), (b"abcdef", 10)):
+        table[numpy.frombuffer(digits, dtype=numpy.uint8)] = numpy.arange(
+            first, first + len(digits)
+        )
+    return table
+
+
+def _checksum_mask_numpy(
+    data: Buffer, offsets: Sequence[int], lengths: Sequence[int]
+) -> Any:
+    buffer = numpy.frombuffer(data, dtype=numpy.uint8)
+    start = numpy.asarray(offsets, dtype=numpy.int64) + 1
+    star = start + numpy.asarray(lengths, dtype=numpy.int64) - 4
+    if len(start) == 0:
+        return numpy.zeros(0, dtype=bool)
+    # reduceat() XORs buffer[bounds[i] : bounds[i + 1]]; the even slots are the bodies.
+    bounds = numpy.empty(2 * len(start), dtype=numpy.int64)
+    bounds[0::2] = start
+    bounds[1::2] = star
+    computed = numpy.bitwise_xor.reduceat(buffer, bounds)[0::2]
+    digits = _hex_digits()
+    high, low = digits[buffer[star + 1]], digits[buffer[star + 2]]
+    return (
+        (buffer[star] == ord(b"*"))
+        & (high >= 0)
+        & (low >= 0)
+        & (high * 16 + low == computed)
+    )
+
+
+test_checksum_mask = """
+>>> capture = b'''
+... $GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*00
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*4x
+... '''
+>>> from nmea_index import scan
+>>> entries = list(scan(capture))
+>>> offsets = [e.offset for e in entries]
+>>> lengths = [e.length for e in entries]
+>>> [e.valid for e in entries]
+[True, True, False, False]
+>>> [bool(valid) for valid in checksum_mask(capture, offsets, lengths)]
+[True, True, False, False]
+>>> _checksum_mask_python(capture, offsets, lengths)
+[True, True, False, False]
+>>> list(checksum_mask(capture, [], []))
+[]
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
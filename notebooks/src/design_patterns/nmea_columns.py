@@ -0,0 +1,142 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import math
+from array import array
+from typing import Any, Callable, Iterable, NamedTuple, Optional, Union
+from nmea_sentences import decode_degrees
+from nmea_states import Buffer, Reader
+
+
+def decode_seconds(text: bytes) -> float:
+    """``hhmmss.sss`` as seconds since midnight."""
+    return int(text[0:2]) * 3600 + int(text[2:4]) * 60 + float(text[4:])
+
+
+class Column(NamedTuple):
+    name: str
+    typecode: str
+    indices: tuple[int, ...]
+    decode: Callable[..., Union[int, float]]
+    missing: Union[int, float]
+
+
+GGA_COLUMNS = [
+    Column("time", "d", (1,), decode_seconds, math.nan),
+    Column("latitude", "d", (2, 3), decode_degrees, math.nan),
+    Column("longitude", "d", (4, 5), decode_degrees, math.nan),
+    Column("fix_quality", "b", (6,), int, -1),
+    Column("satellites", "b", (7,), int, -1),
+    Column("hdop", "d", (8,), float, math.nan),
+    Column("altitude", "d", (9,), float, math.nan),
+]
+
+RMC_COLUMNS = [
+    Column("time", "d", (1,), decode_seconds, math.nan),
+    Column("latitude", "d", (3, 4), decode_degrees, math.nan),
+    Column("longitude", "d", (5, 6), decode_degrees, math.nan),
+    Column("speed_knots", "d", (7,), float, math.nan),
+    Column("course", "d", (8,), float, math.nan),
+]
+
+
+class ColumnarBatch:
+    """One sentence type, parsed into one compact typed array per field.
+
+    Each column is an ``array.array``, so memory is a fixed few bytes per
+    sentence and no per-sentence objects are kept. :meth:`to_numpy` wraps
+    the same memory as NumPy arrays without copying. Empty, undecodable,
+    or out of range fields hold the column's ``missing`` value: NaN, or -1
+    for integers.
+    """
+
+    def __init__(
+        self, sentence_type: bytes = b"GGA", columns: list[Column] = GGA_COLUMNS
+    ) -> None:
+        self.sentence_type = sentence_type
+        self.columns = columns
+        self.arrays: dict[str, array[Any]] = {
+            column.name: array(column.typecode) for column in columns
+        }
+
+    def __len__(self) -> int:
+        return len(self.arrays[self.columns[0].name])
+
+    def read(
+        self, source: Iterable[Buffer], reader: Optional[Reader] = None
+    ) -> "ColumnarBatch":
+        """Append every sentence of our type in ``source``.
+
+        Overlong or garbled sentences are skipped, unless ``reader`` is a
+        strict one.
+        """
+        reader = reader or Reader(resilient=True)
+        for message in reader.read_views(source):
+            # Skip other sentence types before splitting any fields.
+            if message.header()[2:5] == self.sentence_type:
+                self.append(message.fields())
+        return self
+
+    def append(self, fields: list[bytes]) -> None:
+        for column in self.columns:
+            raw = [fields[i] if i < len(fields) else b"" for i in column.indices]
+            values = self.arrays[column.name]
+            try:
+                values.append(column.decode(*raw) if all(raw) else column.missing)
+            except (ValueError, OverflowError):
+                # Unreadable, or too big for the column's array.
+                values.append(column.missing)
+
+    def to_numpy(self) -> dict[str, Any]:
+        import numpy
+
+        return {
+            name: numpy.frombuffer(values, dtype=values.typecode)
+            for name, values in self.arrays.items()
+        }
+
+
+test_columnar_batch = """
+>>> capture = b'''
+... $GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41
+... $GPGGA,161230.487,3723.2475,S,,,0,,,,M,,,,0000*45
+... '''
+>>> batch = ColumnarBatch(b"GGA").read([capture])
+>>> len(batch)
+2
+>>> batch.arrays["time"]
+array('d', [58349.487, 58350.487])
+>>> [round(x, 4) for x in batch.arrays["latitude"]]
+[37.3875, -37.3875]
+>>> batch.arrays["longitude"]
+array('d', [-121.97236, nan])
+>>> batch.arrays["fix_quality"], batch.arrays["satellites"]
+(array('b', [1, 0]), array('b', [7, -1]))
+
+A satellite count too big for its column is missing; an overlong or
+garbled sentence is skipped without ending the batch.
+
+>>> from nmea_bench import sentence
+>>> batch = ColumnarBatch(b"GGA").read([
+...     sentence(b"GPGGA,161229.487,3723.2475,N,12158.3416,W,1,200,1.0,9.0,M,,,,0000")
+...     + b"$GPGGA," + b"9" * 100 + b"*00"
+...     + b"$GPGGA,1*ZZ"
+...     + sentence(b"GPGGA,161230.487,3723.2475,N,12158.3416,W,1,08,1.0,9.0,M,,,,0000")
+... ])
+>>> batch.arrays["satellites"]
+array('b', [-1, 8])
+
+>>> rmc = ColumnarBatch(b"RMC", RMC_COLUMNS).read([
+...     b"$GPRMC,161229.487,A,3723.2475,N,12158.3416,W,0.13,309.62,120598,,*10"
+... ])
+>>> rmc.arrays["speed_knots"], rmc.arrays["course"]
+(array('d', [0.13]), array('d', [309.62]))
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
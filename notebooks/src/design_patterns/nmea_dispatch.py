@@ -0,0 +1,167 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import threading
+from concurrent.futures import Executor, Future, wait
+from typing import Callable, Iterable, Optional
+from nmea_sentences import RawSentence
+
+Handler = Callable[[RawSentence], None]
+
+
+class Subscription:
+    def __init__(
+        self, handler: Handler, talker: Optional[bytes], sentence_type: Optional[bytes]
+    ) -> None:
+        self.handler = handler
+        self.talker = talker
+        self.sentence_type = sentence_type
+
+    def matches(self, header: bytes) -> bool:
+        return (self.talker is None or header[:2] == self.talker) and (
+            self.sentence_type is None or header[2:5] == self.sentence_type
+        )
+
+
+class Dispatcher:
+    """Routes each sentence to the handlers subscribed to its talker or type.
+
+    Routing only looks at ``header()``; the handlers for each distinct
+    header are worked out once and kept in a lookup table. A sentence
+    nobody wants is rejected before its fields are ever split.
+
+    With an ``executor``, handlers run on it instead of inline. Feed it
+    ``Reader.read_chunks()`` messages then, not ``read_views()``: a view's
+    buffer may be reused before a pooled handler gets to it. Once
+    ``max_pending`` handlers are queued or running, :meth:`dispatch` waits
+    for one to finish, which slows the feed down to the handlers' pace.
+    """
+
+    def __init__(
+        self, executor: Optional[Executor] = None, max_pending: int = 1024
+    ) -> None:
+        self.executor = executor
+        self.subscriptions: list[Subscription] = []
+        self.routes: dict[bytes, tuple[Handler, ...]] = {}
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.pending: set[Future[None]] = set()
+        # Finished handlers that raised, kept for join() to report.
+        self.failed: list[Future[None]] = []
+        self.rejected = 0
+
+    def subscribe(
+        self,
+        handler: Handler,
+        talker: Optional[bytes] = None,
+        sentence_type: Optional[bytes] = None,
+    ) -> None:
+        self.subscriptions.append(Subscription(handler, talker, sentence_type))
+        self.routes.clear()
+
+    def route(self, header: bytes) -> tuple[Handler, ...]:
+        if (handlers := self.routes.get(header)) is None:
+            handlers = tuple(
+                s.handler for s in self.subscriptions if s.matches(header)
+            )
+            self.routes[header] = handlers
+        return handlers
+
+    def dispatch(self, message: RawSentence) -> None:
+        handlers = self.route(message.header())
+        if not handlers:
+            self.rejected += 1
+        for handler in handlers:
+            if self.executor:
+                self.slots.acquire()
+                future = self.executor.submit(handler, message)
+                with self.lock:
+                    self.pending.add(future)
+                future.add_done_callback(self.finished)
+            else:
+                handler(message)
+
+    def finished(self, future: Future[None]) -> None:
+        with self.lock:
+            self.pending.discard(future)
+            if future.exception() is not None:
+                self.failed.append(future)
+        self.slots.release()
+
+    def run(self, messages: Iterable[RawSentence]) -> None:
+        for message in messages:
+            self.dispatch(message)
+        self.join()
+
+    def join(self) -> None:
+        """Wait for pooled handlers, re-raising the first exception."""
+        with self.lock:
+            pending = list(self.pending)
+        wait(pending)
+        with self.lock:
+            failed, self.failed = self.failed, []
+        for future in failed:
+            future.result()
+
+
+test_dispatcher = """
+>>> from nmea_states import Reader
+>>> capture = b'''
+... $GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41
+... $GPGSA,A,3,04,05,,09,12,,,24,,,,,2.5,1.3,2.1*39
+... '''
+>>> fixes, positions = [], []
+>>> dispatcher = Dispatcher()
+>>> dispatcher.subscribe(lambda m: fixes.append(m.fields()[1]), sentence_type=b"GGA")
+>>> dispatcher.subscribe(lambda m: positions.append(m.header()), talker=b"GP")
+>>> dispatcher.run(Reader().read_views([capture]))
+>>> fixes, positions
+([b'161229.487'], [b'GPGGA', b'GPGLL', b'GPGSA'])
+
+>>> dispatcher = Dispatcher()
+>>> dispatcher.subscribe(lambda m: fixes.append(m.header()), sentence_type=b"GLL")
+>>> dispatcher.run(Reader().read_views([capture]))
+>>> dispatcher.rejected, sorted(dispatcher.routes)
+(2, [b'GPGGA', b'GPGLL', b'GPGSA'])
+
+>>> from concurrent.futures import ThreadPoolExecutor
+>>> seen = []
+>>> with ThreadPoolExecutor(4) as pool:
+...     dispatcher = Dispatcher(pool)
+...     dispatcher.subscribe(lambda m: seen.append(m.header()), talker=b"GP")
+...     dispatcher.run(Reader().read_chunks([capture]))
+>>> sorted(seen)
+[b'GPGGA', b'GPGLL', b'GPGSA']
+
+No more than ``max_pending`` handlers wait at once, and finished ones
+aren't kept.
+
+>>> import time
+>>> most = []
+>>> def slow(message):
+...     most.append(len(dispatcher.pending))
+...     time.sleep(0.001)
+>>> with ThreadPoolExecutor(2) as pool:
+...     dispatcher = Dispatcher(pool, max_pending=4)
+...     dispatcher.subscribe(slow)
+...     dispatcher.run(Reader().read_chunks([capture * 50]))
+>>> len(most), max(most) <= 4, dispatcher.pending
+(150, True, set())
+>>> def broken(message):
+...     raise RuntimeError(message.header())
+>>> with ThreadPoolExecutor(2) as pool:
+...     dispatcher = Dispatcher(pool)
+...     dispatcher.subscribe(broken, sentence_type=b"GLL")
+...     dispatcher.run(Reader().read_chunks([capture]))
+Traceback (most recent call last):
+...
+RuntimeError: b'GPGLL'
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
@@ -0,0 +1,197 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import bisect
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional, Sequence, Union
+from nmea_checksum import checksum_mask
+from nmea_states import Buffer, Message, Reader
+
+MAGIC = b"NMEAIDX1"
+# Magic, capture size and capture mtime: a mismatch means the index is stale.
+PREFIX = struct.Struct("<8sQQ")
+# Offset, length, header and checksum-valid flag of one sentence.
+RECORD = struct.Struct("<QH5s?")
+
+
+class Entry(NamedTuple):
+    offset: int
+    length: int
+    header: bytes
+    valid: bool
+
+
+def scan(data: Buffer, reader: Optional[Reader] = None) -> Iterator[Entry]:
+    """Locate every complete sentence in ``data``, valid or not.
+
+    Overlong sentences are skipped, and counted in ``reader.oversize``.
+    """
+    reader = reader or Reader(resilient=True)
+    for end in reader.complete_sentences(data):
+        message = reader.buffer
+        length = message.body_len + len(b"$*") + message.checksum_len
+        try:
+            valid = message.valid
+        except ValueError:
+            # The checksum characters aren't hex digits.
+            valid = False
+        yield Entry(end - length, length, message.header(), valid)
+
+
+class SentenceIndex:
+    """A memory-mapped capture file with a sidecar index of its sentences.
+
+    The index is built on first use and saved beside the capture as
+    ``<capture>.idx``. Later runs reuse it, so looking up sentence N or
+    all the sentences between two offsets never rescans the capture.
+    """
+
+    def __init__(
+        self, capture: Union[str, Path], index: Optional[Union[str, Path]] = None
+    ) -> None:
+        self.capture_path = Path(capture)
+        self.index_path = Path(index) if index else Path(f"{capture}.idx")
+        self.capture = self._map(self.capture_path)
+        stat = self.capture_path.stat()
+        self.signature = PREFIX.pack(MAGIC, stat.st_size, stat.st_mtime_ns)
+        # Overlong sentences left out by build(); unknown for a reused index.
+        self.oversize: Optional[int] = None
+        if not self._is_current():
+            self.build()
+        self.records = self._map(self.index_path)
+
+    @staticmethod
+    def _map(path: Path) -> Buffer:
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return b""
+            return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _is_current(self) -> bool:
+        try:
+            with open(self.index_path, "rb") as file:
+                return file.read(PREFIX.size) == self.signature
+        except FileNotFoundError:
+            return False
+
+    def build(self) -> None:
+        """Scan the whole capture once and write the index file."""
+        partial = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(partial, "wb") as file:
+            file.write(self.signature)
+            reader = Reader(resilient=True)
+            for entry in scan(self.capture, reader):
+                file.write(RECORD.pack(*entry))
+        partial.replace(self.index_path)
+        self.oversize = reader.oversize
+
+    def __len__(self) -> int:
+        return (len(self.records) - PREFIX.size) // RECORD.size
+
+    def __getitem__(self, n: int) -> Entry:
+        if n < 0:
+            n += len(self)
+        if not 0 <= n < len(self):
+            raise IndexError(f"sentence {n} out of range")
+        offset, length, header, valid = RECORD.unpack_from(
+            self.records, PREFIX.size + n * RECORD.size
+        )
+        return Entry(offset, length, header, valid)
+
+    def sentence(self, n: int) -> bytes:
+        """The raw bytes of sentence ``n``, from ``$`` through the checksum."""
+        entry = self[n]
+        return bytes(self.capture[entry.offset : entry.offset + entry.length])
+
+    def find(
+        self, header: Optional[bytes] = None, start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[Entry]:
+        """Entries starting at offsets in ``[start, stop)``, optionally with a given header."""
+        first = bisect.bisect_left(self, start, key=lambda e: e.offset)
+        last = (
+            len(self)
+            if stop is None
+            else bisect.bisect_left(self, stop, key=lambda e: e.offset)
+        )
+        for n in range(first, last):
+            entry = self[n]
+            if header is None or entry.header == header:
+                yield entry
+
+    def messages(
+        self, header: Optional[bytes] = None, start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[Message]:
+        """Parse just the valid sentences selected by :meth:`find`."""
+        reader = Reader()
+        for entry in self.find(header, start, stop):
+            if entry.valid:
+                yield from reader.read_chunks(
+                    [self.capture[entry.offset : entry.offset + entry.length]]
+                )
+
+    def verify(self) -> Sequence[bool]:
+        """Recheck every indexed sentence's checksum against the capture."""
+        records = list(RECORD.iter_unpack(self.records[PREFIX.size :]))
+        offsets = [offset for offset, length, header, valid in records]
+        lengths = [length for offset, length, header, valid in records]
+        return checksum_mask(self.capture, offsets, lengths)
+
+    def close(self) -> None:
+        for view in (self.capture, self.records):
+            if isinstance(view, memoryview):
+                mapped = view.obj
+                view.release()
+                mapped.close()  # type: ignore [attr-defined]
+
+    def __enter__(self) -> "SentenceIndex":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+test_sentence_index = """
+>>> import tempfile
+>>> capture = b'''
+... $GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*00
+... $GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18
+... '''
+>>> overlong = b"$GPXXX," + b"9" * 100 + b"*00\\n"
+>>> with tempfile.TemporaryDirectory() as tmp:
+...     path = Path(tmp) / "capture.nmea"
+...     _ = path.write_bytes(capture)
+...     with SentenceIndex(path) as index:
+...         print(len(index))
+...         print(index[2])
+...         print(index.sentence(1))
+...         print([e.offset for e in index.find(b"GPGGA", start=2, stop=200)])
+...         print([m.header() for m in index.messages(b"GPGLL")])
+...         print([bool(valid) for valid in index.verify()])
+...     print(sorted(p.name for p in Path(tmp).iterdir()))
+...     with SentenceIndex(path) as index:
+...         print(index[-1], index.oversize)
+...     _ = path.write_bytes(capture[:120] + overlong + capture[120:])
+...     with SentenceIndex(path) as index:
+...         print(len(index), index.oversize, index[2].offset - 120 == len(overlong))
+4
+Entry(offset=120, length=49, header=b'GPGLL', valid=False)
+b'$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41'
+[170]
+[b'GPGLL']
+[True, True, False, True]
+['capture.nmea', 'capture.nmea.idx']
+Entry(offset=170, length=68, header=b'GPGGA', valid=True) None
+4 1 True
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
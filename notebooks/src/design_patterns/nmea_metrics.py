@@ -0,0 +1,186 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import collections
+import time
+from typing import Any, Iterable, Iterator, Optional, cast
+from nmea_states import (
+    Buffer,
+    End,
+    Header,
+    Message,
+    NMEA_State,
+    Reader,
+    Waiting,
+)
+
+
+class ReaderMetrics:
+    """Counters describing how cleanly a feed is parsing."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.bytes = 0
+        self.bytes_discarded = 0
+        self.sentences = 0
+        self.checksum_failures = 0
+        self.header_restarts = 0
+        self.oversize = 0
+        self.state_bytes: collections.Counter[str] = collections.Counter()
+        self.transitions: collections.Counter[tuple[str, str]] = collections.Counter()
+
+    def observe(self, old: NMEA_State, new: NMEA_State, consumed: Buffer) -> None:
+        name = old.__class__.__name__
+        self.state_bytes[name] += len(consumed)
+        if isinstance(old, (Waiting, End)):
+            # Line terminators and the $ that starts a sentence aren't noise.
+            noise = bytes(consumed)
+            self.bytes_discarded += len(noise) - sum(
+                noise.count(c) for c in (b"\r", b"\n", b"$")
+            )
+        if new is not old:
+            self.transitions[name, new.__class__.__name__] += 1
+            if isinstance(old, Header) and isinstance(new, Header):
+                self.header_restarts += 1
+
+    def complete(self, message: Message) -> None:
+        try:
+            valid = message.valid
+        except ValueError:
+            valid = False
+        if valid:
+            self.sentences += 1
+        else:
+            self.checksum_failures += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "bytes": self.bytes,
+            "bytes_discarded": self.bytes_discarded,
+            "sentences": self.sentences,
+            "checksum_failures": self.checksum_failures,
+            "header_restarts": self.header_restarts,
+            "oversize": self.oversize,
+            "elapsed": elapsed,
+            "sentences_per_second": self.sentences / elapsed if elapsed else 0.0,
+            "state_bytes": dict(self.state_bytes),
+            "transitions": {
+                f"{old}->{new}": count for (old, new), count in self.transitions.items()
+            },
+        }
+
+
+class InstrumentedReader(Reader):
+    """A :class:`Reader` that records :class:`ReaderMetrics` as it parses.
+
+    The plain ``Reader`` is left alone, so metrics cost nothing unless
+    this subclass is used instead.
+    """
+
+    def __init__(
+        self, metrics: Optional[ReaderMetrics] = None, resilient: bool = False
+    ) -> None:
+        super().__init__(resilient)
+        self.metrics = metrics or ReaderMetrics()
+
+    def read(self, source: Iterable[bytes]) -> Iterator[Message]:
+        metrics = self.metrics
+        for byte in cast(Iterable[int], source):
+            metrics.bytes += 1
+            old = self.state
+            try:
+                self.state = old.feed_byte(byte)
+            except IndexError:
+                metrics.oversize += 1
+                if not self.resilient:
+                    raise
+                self.drop_oversize()
+            metrics.observe(old, self.state, bytes((byte,)))
+            if isinstance(self.state, End) and self.state is not old:
+                if self.buffer.checksum_len == 2:
+                    metrics.complete(self.buffer)
+            if self.buffer.checksum_len == 2 and self.sentence_valid():
+                yield self.buffer
+                self.buffer = Message()
+                self.state = Waiting(self.buffer)
+
+    def complete_sentences(self, data: Buffer) -> Iterator[int]:
+        metrics = self.metrics
+        metrics.bytes += len(data)
+        pos, size = 0, len(data)
+        while pos < size:
+            old = self.state
+            try:
+                self.state, end = old.feed_chunk(data, pos)
+            except IndexError:
+                metrics.oversize += 1
+                if not self.resilient:
+                    raise
+                self.drop_oversize()
+                continue
+            metrics.observe(old, self.state, data[pos:end])
+            pos = end
+            if self.buffer.checksum_len == 2:
+                metrics.complete(self.buffer)
+                yield pos
+                self.buffer.reset()
+                self.state = Waiting(self.buffer)
+
+
+test_instrumented_reader = """
+>>> capture = b'''noise
+... $GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18
+... $GP$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*00 junk
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41
+... '''
+>>> by_byte = InstrumentedReader()
+>>> len(list(by_byte.read(capture)))
+3
+>>> by_chunk = InstrumentedReader()
+>>> len(list(by_chunk.read_chunks([capture[:100], capture[100:]])))
+3
+>>> counters = [
+...     "bytes", "bytes_discarded", "sentences", "checksum_failures",
+...     "header_restarts", "oversize",
+... ]
+>>> snapshot = by_byte.metrics.snapshot()
+>>> {name: snapshot[name] for name in counters}
+{'bytes': 233, 'bytes_discarded': 10, 'sentences': 3, 'checksum_failures': 1, 'header_restarts': 1, 'oversize': 0}
+>>> {name: by_chunk.metrics.snapshot()[name] for name in counters} == {
+...     name: snapshot[name] for name in counters
+... }
+True
+>>> snapshot["transitions"]["Body->Checksum"]
+4
+
+A run of bytes with no ``*`` overflows the body.
+
+>>> overflow = InstrumentedReader()
+>>> list(overflow.read_chunks([b"$GPGGA," + b"9" * 100]))
+Traceback (most recent call last):
+...
+IndexError: bytearray index out of range
+>>> overflow.metrics.oversize
+1
+
+A resilient reader counts a garbled checksum as a failure and carries on,
+whichever way it reads.
+
+>>> garbled = b"$GPGLL,1*ZZ\\r\\n" + capture
+>>> for method in ["read", "read_chunks"]:
+...     reader = InstrumentedReader(resilient=True)
+...     source = garbled if method == "read" else [garbled]
+...     messages = list(getattr(reader, method)(source))
+...     print(method, len(messages), reader.metrics.checksum_failures)
+read 3 2
+read_chunks 3 2
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
@@ -0,0 +1,193 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import collections
+import mmap
+import os
+import time
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional, Union
+from nmea_states import MessageView, Reader
+
+
+@dataclass
+class ChunkStats:
+    start: int
+    stop: int
+    sentences: int
+    seconds: float
+    worker: int
+    # Overlong sentences skipped.
+    oversize: int = 0
+
+    @property
+    def mb_per_s(self) -> float:
+        return (self.stop - self.start) / self.seconds / 1e6 if self.seconds else 0.0
+
+
+def split(path: Union[str, Path], chunk_size: int) -> list[tuple[int, int]]:
+    """Cut a capture into ``(start, stop)`` ranges that each begin at a ``$``.
+
+    Every state goes back to ``Header`` on a ``$``, so whatever came before
+    one can't affect the sentences after it. Parsing the ranges separately
+    therefore finds exactly the sentences one ``Reader`` would.
+    """
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as capture:
+            starts = [0]
+            while (start := capture.find(b"$", starts[-1] + chunk_size)) != -1:
+                starts.append(start)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def parse_range(
+    path: Union[str, Path], start: int, stop: int
+) -> tuple[array[int], array[int], ChunkStats]:
+    """Worker: map the capture and parse the bytes in ``[start, stop)``.
+
+    Returns where each valid sentence starts in the file, and its body
+    length: a few bytes per sentence to send back, where pickling every
+    ``Message`` cost the parent about a third of the parsing time.
+    """
+    began = time.perf_counter()
+    starts, body_lens = array("Q"), array("H")
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as capture:
+            with memoryview(capture)[start:stop] as chunk:
+                reader = Reader(resilient=True)
+                views = reader.read_views([chunk])
+                # Only ints escape, so no view outlives the chunk.
+                for offset, body_len in ((v.start, v.body_len) for v in views):
+                    starts.append(start + offset)
+                    body_lens.append(body_len)
+    stats = ChunkStats(
+        start,
+        stop,
+        len(starts),
+        time.perf_counter() - began,
+        os.getpid(),
+        reader.oversize,
+    )
+    return starts, body_lens, stats
+
+
+class ParallelReader:
+    """Parse one capture on several cores, yielding messages in file order.
+
+    The messages are :class:`MessageView` objects on this process's own
+    map of the capture. At most ``in_flight`` chunks are queued or parsed
+    at a time, so a big file isn't held in memory all at once.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        chunk_size: int = 16 * 2**20,
+        in_flight: Optional[int] = None,
+    ) -> None:
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.in_flight = in_flight or 2 * (workers or os.cpu_count() or 1)
+        self.stats: list[ChunkStats] = []
+
+    def read_file(self, path: Union[str, Path]) -> Iterator[MessageView]:
+        if os.path.getsize(path) == 0:
+            return
+        ranges = iter(split(path, self.chunk_size))
+        with open(path, "rb") as file:
+            # Closed once the last view of it is gone.
+            capture = memoryview(
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            )
+        pending: collections.deque[
+            Future[tuple[array[int], array[int], ChunkStats]]
+        ] = collections.deque()
+        with ProcessPoolExecutor(self.workers) as executor:
+            while True:
+                while len(pending) < self.in_flight and (
+                    next_range := next(ranges, None)
+                ):
+                    pending.append(executor.submit(parse_range, path, *next_range))
+                if not pending:
+                    break
+                # Results are taken in submission order: file order.
+                starts, body_lens, stats = pending.popleft().result()
+                self.stats.append(stats)
+                for start, body_len in zip(starts, body_lens):
+                    yield MessageView(capture, start, body_len)
+
+    def worker_stats(self) -> dict[int, dict[str, float]]:
+        """Bytes, sentences, seconds and MB/s for each worker process."""
+        summary: dict[int, dict[str, float]] = {}
+        for chunk in self.stats:
+            worker = summary.setdefault(
+                chunk.worker, {"bytes": 0, "sentences": 0, "seconds": 0.0}
+            )
+            worker["bytes"] += chunk.stop - chunk.start
+            worker["sentences"] += chunk.sentences
+            worker["seconds"] += chunk.seconds
+        for worker in summary.values():
+            seconds = worker["seconds"]
+            worker["mb_per_s"] = worker["bytes"] / seconds / 1e6 if seconds else 0.0
+        return summary
+
+
+def main(path: str) -> None:
+    start = time.perf_counter()
+    reader = ParallelReader()
+    count = sum(1 for _ in reader.read_file(path))
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path)
+    print(f"{count} sentences, {size / elapsed / 1e6:.2f} MB/s overall")
+    for worker, stats in reader.worker_stats().items():
+        print(
+            f"  worker {worker}: {stats['sentences']:.0f} sentences, "
+            f"{stats['mb_per_s']:.2f} MB/s"
+        )
+
+
+test_parallel_reader = """
+>>> import tempfile
+>>> capture = (
+...     b"$GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18\\r\\n"
+...     b"$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41\\r\\n"
+...     b"$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*00\\r\\n"
+... ) * 100
+>>> with tempfile.TemporaryDirectory() as tmp:
+...     path = Path(tmp) / "capture.nmea"
+...     _ = path.write_bytes(capture)
+...     ranges = split(path, 1000)
+...     reader = ParallelReader(workers=2, chunk_size=1000, in_flight=3)
+...     result = [m.message() for m in reader.read_file(path)]
+...     starts, body_lens, stats = parse_range(path, *ranges[1])
+>>> all(capture[start] == ord("$") for start, stop in ranges)
+True
+>>> len(ranges), ranges[-1][1] == len(capture)
+(17, True)
+>>> result == [m.message() for m in Reader().read_chunks([capture])]
+True
+>>> len(result)
+200
+>>> sum(s["sentences"] for s in reader.worker_stats().values())
+200
+>>> starts.itemsize + body_lens.itemsize, stats.sentences == len(starts)
+(10, True)
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
+
+if __name__ == "__main__":
+    import sys
+
+    main(sys.argv[1])
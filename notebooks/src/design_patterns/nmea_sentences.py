@@ -0,0 +1,196 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import datetime
+from typing import Any, Callable, Generic, Optional, Protocol, TypeVar, overload
+
+T = TypeVar("T")
+
+
+class RawSentence(Protocol):
+    """Anything a reader yields: ``nmea_states.Message`` or ``MessageView``."""
+
+    def header(self) -> bytes:
+        ...
+
+    def fields(self) -> list[bytes]:
+        ...
+
+
+def decode_time(text: bytes) -> datetime.time:
+    hhmmss, _, fraction = text.partition(b".")
+    return datetime.time(
+        int(hhmmss[0:2]),
+        int(hhmmss[2:4]),
+        int(hhmmss[4:6]),
+        int(fraction.ljust(6, b"0")[:6] or 0),
+    )
+
+
+def decode_date(text: bytes) -> datetime.date:
+    year = int(text[4:6])
+    # Two-digit years; GPS dates start in 1980.
+    century = 1900 if year >= 80 else 2000
+    return datetime.date(century + year, int(text[2:4]), int(text[0:2]))
+
+
+def decode_degrees(text: bytes, hemisphere: bytes) -> float:
+    """``ddmm.mmmm`` or ``dddmm.mmmm`` plus N/S/E/W, as signed decimal degrees."""
+    degrees, minutes = divmod(float(text), 100)
+    value = degrees + minutes / 60
+    return -value if hemisphere in (b"S", b"W") else value
+
+
+class Field(Generic[T]):
+    """A sentence field, decoded the first time it's read and then cached.
+
+    Empty fields decode to ``None``.
+    """
+
+    def __init__(self, *indices: int, decode: Callable[..., T]) -> None:
+        self.indices = indices
+        self.decode = decode
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    @overload
+    def __get__(self, instance: None, owner: type) -> "Field[T]":
+        ...
+
+    @overload
+    def __get__(self, instance: "Sentence", owner: type) -> Optional[T]:
+        ...
+
+    def __get__(self, instance: Optional["Sentence"], owner: type) -> Any:
+        if instance is None:
+            return self
+        if self.name not in instance._cache:
+            raw = [instance.raw(i) for i in self.indices]
+            instance._cache[self.name] = self.decode(*raw) if all(raw) else None
+        return instance._cache[self.name]
+
+
+class Sentence:
+    """Typed access to one sentence; nothing is split or decoded up front."""
+
+    __slots__ = ("message", "_fields", "_cache")
+
+    def __init__(self, message: RawSentence) -> None:
+        self.message = message
+        self._fields: Optional[list[bytes]] = None
+        self._cache: dict[str, Any] = {}
+
+    def header(self) -> bytes:
+        return self.message.header()
+
+    def raw(self, n: int) -> bytes:
+        """Field ``n`` as bytes, or ``b""`` if the sentence is too short."""
+        if self._fields is None:
+            self._fields = self.message.fields()
+        return self._fields[n] if n < len(self._fields) else b""
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.message.header()!r})"
+
+
+class GGA(Sentence):
+    """Global Positioning System Fix Data."""
+
+    __slots__ = ()
+    time = Field(1, decode=decode_time)
+    latitude = Field(2, 3, decode=decode_degrees)
+    longitude = Field(4, 5, decode=decode_degrees)
+    fix_quality = Field(6, decode=int)
+    satellites = Field(7, decode=int)
+    hdop = Field(8, decode=float)
+    altitude = Field(9, decode=float)
+
+
+class GLL(Sentence):
+    """Geographic Position, Latitude/Longitude."""
+
+    __slots__ = ()
+    latitude = Field(1, 2, decode=decode_degrees)
+    longitude = Field(3, 4, decode=decode_degrees)
+    time = Field(5, decode=decode_time)
+    status = Field(6, decode=bytes)
+
+
+class RMC(Sentence):
+    """Recommended Minimum specific GNSS data."""
+
+    __slots__ = ()
+    time = Field(1, decode=decode_time)
+    status = Field(2, decode=bytes)
+    latitude = Field(3, 4, decode=decode_degrees)
+    longitude = Field(5, 6, decode=decode_degrees)
+    speed_knots = Field(7, decode=float)
+    course = Field(8, decode=float)
+    date = Field(9, decode=decode_date)
+
+
+class VTG(Sentence):
+    """Track made good and ground speed."""
+
+    __slots__ = ()
+    true_track = Field(1, decode=float)
+    magnetic_track = Field(3, decode=float)
+    speed_knots = Field(5, decode=float)
+    speed_kmh = Field(7, decode=float)
+
+
+# Keyed by sentence type, so any talker ID (GP, GN, GL...) matches.
+sentence_types: dict[bytes, type[Sentence]] = {
+    b"GGA": GGA,
+    b"GLL": GLL,
+    b"RMC": RMC,
+    b"VTG": VTG,
+}
+
+
+def typed(message: RawSentence) -> Optional[Sentence]:
+    """Wrap a message in its typed class, or ``None`` for other sentence types."""
+    sentence_class = sentence_types.get(message.header()[2:5])
+    return sentence_class(message) if sentence_class else None
+
+
+test_typed_sentences = """
+>>> from nmea_states import Reader
+>>> capture = b'''
+... $GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41
+... $GPRMC,161229.487,A,3723.2475,N,12158.3416,W,0.13,309.62,120598,,*10
+... $GPVTG,309.62,T,,M,0.13,N,0.2,K*6E
+... '''
+>>> gga, gll, rmc, vtg = [typed(m) for m in Reader().read_chunks([capture])]
+>>> gga, gll, rmc, vtg
+(GGA(b'GPGGA'), GLL(b'GPGLL'), RMC(b'GPRMC'), VTG(b'GPVTG'))
+
+Only the header has been looked at so far.
+
+>>> gga._fields is None
+True
+>>> round(gga.latitude, 6), round(gga.longitude, 6)
+(37.387458, -121.97236)
+>>> gga.time, gga.fix_quality, gga.satellites, gga.altitude
+(datetime.time(16, 12, 29, 487000), 1, 7, 9.0)
+>>> sorted(gga._cache)
+['altitude', 'fix_quality', 'latitude', 'longitude', 'satellites', 'time']
+>>> gll.status, gll.time
+(b'A', datetime.time(16, 12, 29, 487000))
+>>> rmc.date, rmc.speed_knots, rmc.course
+(datetime.date(1998, 5, 12), 0.13, 309.62)
+>>> vtg.true_track, vtg.magnetic_track, vtg.speed_kmh
+(309.62, None, 0.2)
+>>> gsa = b"$GPGSA,A,3,04,05,,09,12,,,24,,,,,2.5,1.3,2.1*39"
+>>> [typed(m) for m in Reader().read_chunks([gsa])]
+[None]
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
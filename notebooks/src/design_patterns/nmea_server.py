@@ -0,0 +1,228 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, cast, Optional, Tuple
+from nmea_states import Message, Reader
+
+Address = Tuple[Any, ...]
+Delivery = Tuple[Address, Message]
+
+
+class NMEAHub:
+    """Fans sentences from every feed out to bounded subscriber queues.
+
+    A TCP feed waits in :meth:`publish` while any subscriber's queue is
+    full; it stops reading its socket in the meantime, so TCP flow control
+    slows the sender down. UDP can't push back, so a UDP sentence for a
+    full queue is dropped and counted instead.
+    """
+
+    def __init__(self) -> None:
+        self.subscribers: list[asyncio.Queue[Delivery]] = []
+        self.dropped = 0
+
+    def subscribe(self, maxsize: int = 1024) -> asyncio.Queue[Delivery]:
+        queue: asyncio.Queue[Delivery] = asyncio.Queue(maxsize)
+        self.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue[Delivery]) -> None:
+        self.subscribers.remove(queue)
+
+    async def publish(self, source: Address, message: Message) -> None:
+        for queue in self.subscribers:
+            await queue.put((source, message))
+
+    def publish_nowait(self, source: Address, message: Message) -> None:
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait((source, message))
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+
+class NMEADatagramProtocol(asyncio.DatagramProtocol):
+    """Keeps a ``Reader`` for each source address.
+
+    A source silent for ``idle_timeout`` seconds loses its reader, along
+    with any sentence it left half sent; past ``max_sources`` the longest
+    silent source goes first.
+    """
+
+    def __init__(
+        self, hub: NMEAHub, idle_timeout: float = 60.0, max_sources: int = 1024
+    ) -> None:
+        self.hub = hub
+        self.idle_timeout = idle_timeout
+        self.max_sources = max_sources
+        # Least recently heard from first.
+        self.readers: dict[Address, tuple[Reader, float]] = {}
+
+    def datagram_received(self, data: bytes, addr: Address) -> None:
+        now = time.monotonic()
+        known = self.readers.pop(addr, None)
+        reader = known[0] if known else Reader(resilient=True)
+        self.evict(now)
+        self.readers[addr] = (reader, now)
+        for message in reader.read_chunks([data]):
+            self.hub.publish_nowait(addr, message)
+
+    def evict(self, now: float) -> None:
+        for addr, (_, heard) in list(self.readers.items()):
+            if (
+                now - heard < self.idle_timeout
+                and len(self.readers) < self.max_sources
+            ):
+                break
+            del self.readers[addr]
+
+
+class NMEAServer:
+    """Accepts many TCP and UDP NMEA feeds, each with its own ``Reader``."""
+
+    def __init__(
+        self, hub: Optional[NMEAHub] = None, chunk_size: int = 64 * 1024
+    ) -> None:
+        self.hub = hub or NMEAHub()
+        self.chunk_size = chunk_size
+        self.tcp: Optional[asyncio.Server] = None
+        self.udp: Optional[asyncio.DatagramTransport] = None
+        self.feeds: dict[asyncio.Task[None], asyncio.StreamWriter] = {}
+
+    async def handle_feed(
+        self, stream: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        peer = writer.get_extra_info("peername")
+        reader = Reader(resilient=True)
+        feed = cast("asyncio.Task[None]", asyncio.current_task())
+        self.feeds[feed] = writer
+        try:
+            while data := await stream.read(self.chunk_size):
+                for message in reader.read_chunks([data]):
+                    await self.hub.publish(peer, message)
+        except ConnectionError:
+            # The feed went away; the other feeds carry on.
+            pass
+        finally:
+            del self.feeds[feed]
+            writer.close()
+
+    async def start_tcp(self, host: str = "localhost", port: int = 10110) -> Address:
+        self.tcp = await asyncio.start_server(self.handle_feed, host, port)
+        return tuple(self.tcp.sockets[0].getsockname())
+
+    async def start_udp(self, host: str = "localhost", port: int = 10110) -> Address:
+        loop = asyncio.get_running_loop()
+        self.udp, _ = await loop.create_datagram_endpoint(
+            lambda: NMEADatagramProtocol(self.hub), local_addr=(host, port)
+        )
+        return tuple(self.udp.get_extra_info("sockname"))
+
+    async def close(self) -> None:
+        if self.tcp:
+            self.tcp.close()
+            await self.tcp.wait_closed()
+        # Closing the server doesn't end the feeds it has accepted; closing
+        # their transports does, and each handler finishes at end of data.
+        feeds = list(self.feeds)
+        for writer in self.feeds.values():
+            writer.close()
+        await asyncio.gather(*feeds, return_exceptions=True)
+        if self.udp:
+            self.udp.close()
+
+
+async def main(host: str = "localhost", port: int = 10110) -> None:
+    server = NMEAServer()
+    queue = server.hub.subscribe()
+    await server.start_tcp(host, port)
+    await server.start_udp(host, port)
+    print(f"{host} listening for NMEA feeds on port {port}")
+    while True:
+        source, message = await queue.get()
+        print(source, message.message())
+
+
+test_nmea_server = """
+>>> capture = (
+...     b"$GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18\\r\\n"
+...     b"$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41\\r\\n"
+... )
+>>> async def demo() -> list[bytes]:
+...     server = NMEAServer()
+...     queue = server.hub.subscribe(maxsize=1)
+...     host, port = await server.start_tcp(port=0)
+...     feeds = []
+...     for _ in range(3):
+...         _, writer = await asyncio.open_connection(host, port)
+...         writer.write(capture[:40])
+...         await writer.drain()
+...         feeds.append(writer)
+...     for writer in feeds:
+...         writer.write(capture[40:])
+...         writer.close()
+...     headers = [(await queue.get())[1].header() for _ in range(6)]
+...     await server.close()
+...     return headers
+>>> headers = asyncio.run(demo())
+>>> sorted(headers)
+[b'GPGGA', b'GPGGA', b'GPGGA', b'GPGLL', b'GPGLL', b'GPGLL']
+
+>>> async def demo_udp() -> tuple[list[bytes], int]:
+...     server = NMEAServer()
+...     queue = server.hub.subscribe(maxsize=1)
+...     host, port = await server.start_udp(port=0)
+...     loop = asyncio.get_running_loop()
+...     transport, _ = await loop.create_datagram_endpoint(
+...         asyncio.DatagramProtocol, remote_addr=(host, port)
+...     )
+...     transport.sendto(capture[:40])
+...     transport.sendto(capture[40:])
+...     first = await queue.get()
+...     while server.hub.dropped == 0:
+...         await asyncio.sleep(0.01)
+...     transport.close()
+...     await server.close()
+...     return [first[1].header()], server.hub.dropped
+>>> asyncio.run(demo_udp())
+([b'GPGGA'], 1)
+
+Garbled sentences are skipped without dropping the feed.
+
+>>> garbled = b"$GPXXX," + b"9" * 100 + b"*00\\r\\n$GPGLL,1*ZZ\\r\\n"
+>>> async def demo_garbled() -> list[bytes]:
+...     server = NMEAServer()
+...     queue = server.hub.subscribe()
+...     host, port = await server.start_tcp(port=0)
+...     _, writer = await asyncio.open_connection(host, port)
+...     writer.write(garbled + capture)
+...     headers = [(await queue.get())[1].header() for _ in range(2)]
+...     writer.close()
+...     await server.close()
+...     return headers
+>>> asyncio.run(demo_garbled())
+[b'GPGGA', b'GPGLL']
+
+>>> hub = NMEAHub()
+>>> protocol = NMEADatagramProtocol(hub, idle_timeout=60.0, max_sources=2)
+>>> for port in range(5):
+...     protocol.datagram_received(garbled + capture, ("10.0.0.1", port))
+>>> sorted(protocol.readers)
+[('10.0.0.1', 3), ('10.0.0.1', 4)]
+>>> protocol.idle_timeout = 0.0
+>>> protocol.datagram_received(capture[:10], ("10.0.0.2", 1))
+>>> list(protocol.readers)
+[('10.0.0.2', 1)]
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,7 +4,17 @@ Python 3 Object-Oriented Programming
 Chapter 11. Common Design Patterns
 """
 from __future__ import annotations
-from typing import Optional, Iterable, Iterator, cast
+import functools
+import operator
+import re
+import time
+from typing import Callable, Optional, Iterable, Iterator, Union, cast
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+DOLLAR = re.compile(rb"\$")
+DOLLAR_STAR = re.compile(rb"[$*]")
+COMMA = re.compile(rb",")
 
 
 class NMEA_State:
@@ -14,6 +24,14 @@ class NMEA_State:
     def feed_byte(self, input: int) -> "NMEA_State":
         return self
 
+    def feed_chunk(self, data: Buffer, start: int) -> tuple["NMEA_State", int]:
+        """Consume bytes of ``data`` from ``start``; return the next state and position.
+
+        The default consumes one byte. States that can skip or copy
+        a whole run of bytes in one step override this.
+        """
+        return self.feed_byte(data[start]), start + 1
+
     def valid(self) -> bool:
         return False
 
@@ -27,6 +45,11 @@ class Waiting(NMEA_State):
             return Header(self.message)
         return self
 
+    def feed_chunk(self, data: Buffer, start: int) -> tuple[NMEA_State, int]:
+        if (dollar := DOLLAR.search(data, start)) is None:
+            return self, len(data)
+        return Header(self.message), dollar.end()
+
 
 class Header(NMEA_State):
     def __init__(self, message: "Message") -> None:
@@ -42,6 +65,15 @@ class Header(NMEA_State):
             return Body(self.message)
         return self
 
+    def feed_chunk(self, data: Buffer, start: int) -> tuple[NMEA_State, int]:
+        stop = min(start + 5 - self.message.body_len, len(data))
+        if (dollar := DOLLAR.search(data, start, stop)) is not None:
+            return Header(self.message), dollar.end()
+        size = self.message.body_extend(data[start:stop])
+        if size == 5:
+            return Body(self.message), stop
+        return self, stop
+
 
 class Body(NMEA_State):
     def feed_byte(self, input: int) -> NMEA_State:
@@ -52,6 +84,16 @@ class Body(NMEA_State):
         self.message.body_append(input)
         return self
 
+    def feed_chunk(self, data: Buffer, start: int) -> tuple[NMEA_State, int]:
+        if (match := DOLLAR_STAR.search(data, start)) is None:
+            self.message.body_extend(data[start:])
+            return self, len(data)
+        stop = match.start()
+        self.message.body_extend(data[start:stop])
+        if data[stop] == ord(b"$"):
+            return Header(self.message), stop + 1
+        return Checksum(self.message), stop + 1
+
 
 class Checksum(NMEA_State):
     def feed_byte(self, input: int) -> NMEA_State:
@@ -97,6 +139,17 @@ class Message:
         self.checksum_computed ^= input
         return self.body_len
 
+    def body_extend(self, input: Buffer) -> int:
+        end = self.body_len + len(input)
+        if end > len(self.body):
+            raise IndexError("bytearray index out of range")
+        self.body[self.body_len : end] = input
+        self.body_len = end
+        self.checksum_computed = functools.reduce(
+            operator.xor, input, self.checksum_computed
+        )
+        return self.body_len
+
     def checksum_append(self, input: int) -> int:
         self.checksum_source[self.checksum_len] = input
         self.checksum_len += 1
@@ -129,19 +182,148 @@ class Message:
         )
 
 
+class MessageView:
+    """A valid sentence, seen in place in the buffer it arrived in.
+
+    Nothing is copied until a caller asks for ``bytes``. The view is only
+    good while that buffer is: a source that refills one buffer, like
+    ``nmea_stream.StreamSource``, overwrites it with the next chunk.
+    """
+
+    __slots__ = ("data", "start", "body_len", "_commas")
+
+    def __init__(self, data: memoryview, start: int, body_len: int) -> None:
+        self.data = data
+        self.start = start
+        self.body_len = body_len
+        self._commas: Optional[list[int]] = None
+
+    @property
+    def body(self) -> memoryview:
+        return self.data[self.start + 1 : self.start + 1 + self.body_len]
+
+    @property
+    def checksum_source(self) -> memoryview:
+        checksum = self.start + 2 + self.body_len
+        return self.data[checksum : checksum + 2]
+
+    def header(self) -> bytes:
+        return bytes(self.data[self.start + 1 : self.start + 6])
+
+    def field(self, n: int) -> memoryview:
+        """Field ``n``, located without splitting the rest of the body."""
+        if self._commas is None:
+            body = self.start + 1
+            self._commas = [body - 1]
+            self._commas.extend(
+                comma.start()
+                for comma in COMMA.finditer(self.data, body, body + self.body_len)
+            )
+            self._commas.append(body + self.body_len)
+        return self.data[self._commas[n] + 1 : self._commas[n + 1]]
+
+    def fields(self) -> list[bytes]:
+        return bytes(self.body).split(b",")
+
+    def __repr__(self) -> str:
+        body = bytes(self.body)
+        checksum = bytes(self.checksum_source)
+        return f"MessageView({body!r}, {checksum!r})"
+
+    def message(self) -> bytes:
+        return bytes(self.data[self.start : self.start + 4 + self.body_len])
+
+
 class Reader:
-    def __init__(self) -> None:
+    def __init__(self, resilient: bool = False) -> None:
         self.buffer = Message()
         self.state: NMEA_State = Waiting(self.buffer)
+        # When resilient, an overlong sentence is counted and skipped
+        # instead of raising IndexError, and a checksum that isn't hex
+        # makes a sentence invalid instead of raising ValueError.
+        self.resilient = resilient
+        self.oversize = 0
+
+    def sentence_valid(self) -> bool:
+        try:
+            return self.buffer.valid
+        except ValueError:
+            if not self.resilient:
+                raise
+            return False
 
     def read(self, source: Iterable[bytes]) -> Iterator[Message]:
         for byte in source:
-            self.state = self.state.feed_byte(cast(int, byte))
-            if self.buffer.valid:
+            try:
+                self.state = self.state.feed_byte(cast(int, byte))
+            except IndexError:
+                if not self.resilient:
+                    raise
+                self.drop_oversize()
+            if self.buffer.checksum_len == 2 and self.sentence_valid():
                 yield self.buffer
                 self.buffer = Message()
                 self.state = Waiting(self.buffer)
 
+    def read_chunks(self, source: Iterable[Buffer]) -> Iterator[Message]:
+        """Like :meth:`read`, but each state consumes a whole run of bytes at once.
+
+        Sentences may straddle buffers; the state carries over from one
+        buffer to the next.
+        """
+        for data in source:
+            for _ in self.complete_sentences(data):
+                if self.sentence_valid():
+                    yield self.buffer
+                    self.buffer = Message()
+
+    def read_views(self, source: Iterable[Buffer]) -> Iterator[MessageView]:
+        """Like :meth:`read_chunks`, but yield views into the source buffers.
+
+        A single ``Message`` is reused to compute checksums, so the small
+        view is the only per-sentence allocation. Only a sentence that
+        straddles two buffers is copied out.
+        """
+        for data in source:
+            view = memoryview(data)
+            for end in self.complete_sentences(data):
+                if self.sentence_valid():
+                    length = self.buffer.body_len + 4
+                    if end >= length:
+                        yield MessageView(view, end - length, self.buffer.body_len)
+                    else:
+                        # Started in an earlier buffer, which may be gone by now.
+                        copy = memoryview(self.buffer.message())
+                        yield MessageView(copy, 0, self.buffer.body_len)
+
+    def complete_sentences(self, data: Buffer) -> Iterator[int]:
+        """Feed one buffer, yielding the position just past each sentence.
+
+        A sentence is complete once both checksum characters have arrived,
+        whether or not it is valid; ``self.buffer`` holds it while the
+        caller looks at it.
+        """
+        pos, size = 0, len(data)
+        while pos < size:
+            try:
+                self.state, pos = self.state.feed_chunk(data, pos)
+            except IndexError:
+                if not self.resilient:
+                    raise
+                # Waiting skips the rest of the overlong run from pos.
+                self.drop_oversize()
+            if self.buffer.checksum_len == 2:
+                yield pos
+                # End behaves exactly like Waiting, so go straight there.
+                self.buffer.reset()
+                self.state = Waiting(self.buffer)
+
+    def drop_oversize(self) -> None:
+        """Abandon a sentence too long for the body and resync on the next ``$``."""
+        self.oversize += 1
+        self.buffer.reset()
+        self.state = Waiting(self.buffer)
+
 
 test_reader = """
 >>> message = b'''
@@ -163,5 +345,105 @@ b'$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41'
 
 """
 
+test_read_chunks = """
+>>> message = b'''
+... $GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*00
+... $GP$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*4
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41
+... '''
+>>> expected = list(Reader().read(message))
+>>> chunks = [message[i : i + 7] for i in range(0, len(message), 7)]
+>>> result = list(Reader().read_chunks(chunks))
+>>> len(result)
+3
+>>> [repr(m) for m in result] == [repr(m) for m in expected]
+True
+>>> views = [memoryview(message)]
+>>> [m.message() for m in Reader().read_chunks(views)] == [
+...     m.message() for m in expected
+... ]
+True
+
+"""
+
+test_resilient = """
+>>> message = (
+...     b"$GPGGA," + b"9" * 100 + b"*00\\r\\n"
+...     b"$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41\\r\\n"
+... )
+>>> list(Reader().read(message))
+Traceback (most recent call last):
+...
+IndexError: bytearray index out of range
+>>> rdr = Reader(resilient=True)
+>>> [m.header() for m in rdr.read(message)], rdr.oversize
+([b'GPGLL'], 1)
+>>> rdr = Reader(resilient=True)
+>>> chunks = [message[i : i + 16] for i in range(0, len(message), 16)]
+>>> [m.header() for m in rdr.read_chunks(chunks)], rdr.oversize
+([b'GPGLL'], 1)
+
+A checksum that isn't hex makes a sentence invalid.
+
+>>> garbled = b"$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*ZZ\\r\\n" + message
+>>> list(Reader().read_chunks([garbled]))
+Traceback (most recent call last):
+...
+ValueError: invalid literal for int() with base 16: b'ZZ'
+>>> [m.header() for m in Reader(resilient=True).read(garbled)]
+[b'GPGLL']
+>>> [v.header() for v in Reader(resilient=True).read_views([garbled])]
+[b'GPGLL']
+
+"""
+
+test_read_views = """
+>>> message = b'''
+... $GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41
+... '''
+>>> views = list(Reader().read_views([message[:60], message[60:]]))
+>>> views
+[MessageView(b'GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000', b'18'), MessageView(b'GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A', b'41')]
+>>> views[1].start
+10
+>>> bytes(views[1].field(5))
+b'161229.487'
+>>> bytes(views[1].field(0)), bytes(views[1].field(7))
+(b'GPGLL', b'A')
+>>> [v.fields() for v in views] == [m.fields() for m in Reader().read(message)]
+True
+>>> [v.message() for v in views] == [m.message() for m in Reader().read(message)]
+True
+
+"""
+
+
+def benchmark(repeat: int = 2_000) -> None:
+    """Compare the throughput of :meth:`Reader.read` and :meth:`Reader.read_chunks`."""
+    sample = (
+        b"$GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18\r\n"
+        b"$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41\r\n"
+    )
+    capture = sample * repeat
+    chunks = [capture[i : i + 4096] for i in range(0, len(capture), 4096)]
+    parsers: list[tuple[str, Callable[[], Iterator[object]]]] = [
+        ("read", lambda: Reader().read(cast(Iterable[bytes], capture))),
+        ("read_chunks", lambda: Reader().read_chunks(chunks)),
+        ("read_views", lambda: Reader().read_views(chunks)),
+    ]
+    for name, parse in parsers:
+        start = time.perf_counter()
+        count = sum(1 for _ in parse())
+        elapsed = time.perf_counter() - start
+        rate = len(capture) / elapsed / 1e6
+        print(f"{name:12s} {count:7d} sentences {rate:7.2f} MB/s")
+
 
 __test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
+
+
+if __name__ == "__main__":
+    benchmark()
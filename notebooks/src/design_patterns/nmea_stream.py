@@ -0,0 +1,112 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from __future__ import annotations
+import os
+import socket
+from pathlib import Path
+from typing import Iterator, Optional, Protocol, Union
+
+
+class RawReadable(Protocol):
+    def readinto(self, buffer: bytearray) -> Optional[int]:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class StreamSource:
+    """Adapt a raw file, pipe or socket into buffers for the NMEA readers.
+
+    One ``bytearray`` is allocated up front and refilled with ``readinto``,
+    so memory use stays flat no matter how big the capture is. Each chunk
+    is a ``memoryview`` of that buffer: it is only valid until the next
+    chunk is read, which is fine for the readers because they copy a
+    sentence's bytes into their ``Message`` as they go.
+    """
+
+    def __init__(self, stream: RawReadable, size: int = 64 * 1024) -> None:
+        self.stream = stream
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+
+    def __iter__(self) -> Iterator[memoryview]:
+        """Chunks for :meth:`nmea_states.Reader.read_chunks`."""
+        while count := self.stream.readinto(self.buffer):
+            yield self.view[:count]
+
+    def bytes(self) -> Iterator[int]:
+        """Individual bytes for the byte-at-a-time ``Reader.read`` methods."""
+        for chunk in self:
+            yield from chunk
+
+    def close(self) -> None:
+        self.view.release()
+        self.stream.close()
+
+    def __enter__(self) -> "StreamSource":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    @classmethod
+    def from_path(
+        cls, path: Union[str, Path], size: int = 64 * 1024
+    ) -> "StreamSource":
+        return cls(open(path, "rb", buffering=0), size)
+
+    @classmethod
+    def from_fd(cls, fd: int, size: int = 64 * 1024) -> "StreamSource":
+        """Read from a pipe or other file descriptor; ``fd`` is left open."""
+        return cls(os.fdopen(fd, "rb", buffering=0, closefd=False), size)
+
+    @classmethod
+    def from_socket(cls, sock: socket.socket, size: int = 64 * 1024) -> "StreamSource":
+        return cls(sock.makefile("rb", buffering=0), size)
+
+
+test_stream_source = """
+>>> import io
+>>> import nmea_states
+>>> import nmea_states_2
+>>> capture = b'''
+... $GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18
+... $GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41
+... '''
+
+A tiny buffer forces every sentence to straddle several chunks.
+
+>>> source = StreamSource(io.BytesIO(capture), size=16)
+>>> [m.message() for m in nmea_states.Reader().read_chunks(source)]
+[b'$GPGGA,161229.487,3723.2475,N,12158.3416,W,1,07,1.0,9.0,M,,,,0000*18', b'$GPGLL,3723.2475,N,12158.3416,W,161229.487,A,A*41']
+
+>>> source = StreamSource(io.BytesIO(capture), size=16)
+>>> [m.header() for m in nmea_states_2.Reader().read(source.bytes())]
+[b'GPGGA', b'GPGLL']
+
+>>> import socket
+>>> left, right = socket.socketpair()
+>>> with left:
+...     left.sendall(capture)
+>>> with StreamSource.from_socket(right, size=32) as source:
+...     [m.header() for m in nmea_states.Reader().read_chunks(source)]
+[b'GPGGA', b'GPGLL']
+>>> right.close()
+
+>>> read_fd, write_fd = os.pipe()
+>>> os.write(write_fd, capture) == len(capture)
+True
+>>> os.close(write_fd)
+>>> with StreamSource.from_fd(read_fd, size=32) as source:
+...     [m.header() for m in nmea_states.Reader().read_chunks(source)]
+[b'GPGGA', b'GPGLL']
+>>> os.close(read_fd)
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
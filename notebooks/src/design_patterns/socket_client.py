@@ -4,8 +4,27 @@ Python 3 Object-Oriented Programming
 Chapter 11. Common Design Patterns
 """
 import gzip
-import io
 import socket
+from typing import Iterator, Sequence, Tuple
+from dice_compression import GZIP_MAGIC
+from dice_protocol import encode_frame, read_frame
+
+Address = Tuple[str, int]
+
+
+def recv_all(server: socket.socket) -> bytes:
+    """Everything the server sends before it closes the connection."""
+    chunks = []
+    while chunk := server.recv(65536):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def unzip(response: bytes) -> str:
+    """Rolls arrive gzipped, but errors arrive as plain text."""
+    if response.startswith(GZIP_MAGIC):
+        response = gzip.decompress(response)
+    return response.decode("utf-8")
 
 
 def main_zip() -> None:
@@ -15,10 +34,7 @@ def main_zip() -> None:
     pattern = input("Dice pattern nd6[dk+-]a: ") or "d6"
     command = f"Dice {count} {pattern}"
     server.send(command.encode("utf8"))
-    zipped_response = io.BytesIO(server.recv(1024))
-    with gzip.GzipFile(fileobj=zipped_response) as zipfile:
-        response = zipfile.read()
-    print(response.decode("utf-8"))
+    print(unzip(recv_all(server)))
     server.close()
 
 
@@ -29,10 +45,74 @@ def main() -> None:
     pattern = input("Dice pattern nd6[dk+-]a: ") or "d6"
     command = f"Dice {count} {pattern}"
     server.send(command.encode("utf-8"))
-    response = server.recv(1024)
+    response = recv_all(server)
     print(response.decode("utf-8"))
     server.close()
 
 
+def roll_batch(
+    commands: Sequence[str], address: Address = ("localhost", 2401)
+) -> list[str]:
+    """Send all the commands in one round trip; one response line each."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.connect(address)
+    server.sendall("\n".join(commands).encode("utf-8"))
+    server.shutdown(socket.SHUT_WR)
+    with server.makefile("rb") as stream:
+        responses = stream.read().decode("utf-8").splitlines()
+    server.close()
+    return responses
+
+
+def pipeline(
+    server: socket.socket, requests: Sequence[bytes], window: int = 64
+) -> Iterator[bytes]:
+    """Send framed requests over one connection, answers in order.
+
+    Up to ``window`` requests are sent ahead of their responses; without a
+    limit, both sides could fill their buffers and wait on each other.
+    """
+    with server.makefile("rb") as stream:
+        sent = 0
+        for received in range(len(requests)):
+            if sent == received:
+                batch = requests[sent : sent + window]
+                server.sendall(b"".join(encode_frame(r) for r in batch))
+                sent += len(batch)
+            if (response := read_frame(stream)) is None:
+                raise ConnectionError("Server closed the connection")
+            yield response
+
+
+def main_framed() -> None:
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.connect(("localhost", 2401))
+    while pattern := input("Dice pattern nd6[dk+-]a (blank to quit): "):
+        count = input("How many rolls: ") or "1"
+        request = f"Dice {count} {pattern}".encode("utf-8")
+        for response in pipeline(server, [request]):
+            print(unzip(response))
+    server.close()
+
+
+def main_batch() -> None:
+    count = input("How many rolls: ") or "1"
+    patterns = input("Dice patterns nd6[dk+-]a, space separated: ") or "d6"
+    commands = [f"Dice {count} {pattern}" for pattern in patterns.split()]
+    for response in roll_batch(commands):
+        print(response)
+
+
+test_unzip = """
+>>> unzip(gzip.compress(b"Dice 2 d6 = [3, 5]"))
+'Dice 2 d6 = [3, 5]'
+>>> unzip(b"KeyError('Die')")
+"KeyError('Die')"
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
+
 if __name__ == "__main__":
     main()
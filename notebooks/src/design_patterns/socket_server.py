@@ -25,7 +25,16 @@ def dice_response(client: socket.socket) -> None:
         response = dice.dice_roller(request)
     except (ValueError, KeyError) as ex:
         response = repr(ex).encode("utf-8")
-    client.send(response)
+    client.sendall(response)
+
+
+def dice_batch_response(client: socket.socket) -> None:
+    """Answer every newline-separated request the client sends before it
+    shuts down its side of the connection, one response line each."""
+    with client.makefile("rb") as stream:
+        requests = stream.read().splitlines()
+    responses = dice.dice_roller_batch(requests)
+    client.sendall(b"\n".join(responses))
 
 
 class LogSocket:
@@ -41,6 +50,10 @@ class LogSocket:
         print(f"Sending {data!r} to {self.socket.getpeername()[0]}")
         self.socket.send(data)
 
+    def sendall(self, data: bytes) -> None:
+        print(f"Sending {data!r} to {self.socket.getpeername()[0]}")
+        self.socket.sendall(data)
+
     def close(self) -> None:
         self.socket.close()
 
@@ -73,6 +86,40 @@ def main_2() -> None:
             client.close()
 
 
+def main_batch() -> None:
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("localhost", 2401))
+    print('localhost server listening on port 2401')
+    server.listen(1)
+    with contextlib.closing(server):
+        while True:
+            client, addr = server.accept()
+            dice_batch_response(client)
+            client.close()
+
+
+test_dice_batch_response = """
+>>> import random, threading
+>>> random.seed(42)
+>>> server_side, client_side = socket.socketpair()
+>>> worker = threading.Thread(target=dice_batch_response, args=(server_side,))
+>>> worker.start()
+>>> client_side.sendall(b"Dice 6 4d6d1\\nDice2 2 2d6\\nDice 1 x")
+>>> client_side.shutdown(socket.SHUT_WR)
+>>> worker.join()
+>>> server_side.close()
+>>> print(client_side.makefile("rb").read().decode("utf-8"))
+Dice 6 4d6d1 = [13, 7, 18, 14, 4, 12]
+Dice2 2 2d6 = [7, 12]
+ValueError("Error in 'x'")
+>>> client_side.close()
+
+"""
+
+
+__test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
+
+
 if __name__ == "__main__":
     #main_1()
     main_2()